@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+from lottery_metrics import timed
+from lottery_storage import (COMPRESSION_NONE, compress_bytes, decompress_bytes, encode_json, read_json,
+                             write_bytes_atomic, write_json_atomic)
+
+BACKUP_DIR = "backups"
+OBJECTS_DIRNAME = "objects"
+INDEX_FILENAME = "index.json"
+HISTORY_CHUNK_SIZE = 256
+ROSTER_CHUNK_MASK = 0x3F
+BACKUP_FORMAT = "chunked-v1"
+HISTORY_COLUMNS = ('rounds', 'timestamps', 'modes', 'counts', 'members')
+
+
+def chunk_roster(students):
+    chunk = []
+    for student in students:
+        chunk.append(student)
+        # 以内容决定切分点：插入或删除一个名字只会影响它所在的块
+        if zlib.crc32(str(student).encode('utf-8')) & ROSTER_CHUNK_MASK == 0:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def is_backup_file(name):
+    return name.startswith("backup_") and name.endswith(".json")
+
+
+class BackupStore:
+    def __init__(self, root=BACKUP_DIR, extra_manifests=(), gc_interval=50, compression=COMPRESSION_NONE):
+        self.root = root
+        self.compression = compression
+        self.objects_dir = os.path.join(root, OBJECTS_DIRNAME)
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.extra_manifests = list(extra_manifests)
+        self.gc_interval = gc_interval
+        self.history_cache = {}
+        self.writes_since_gc = 0
+        self.index = None
+        self.lock = threading.RLock()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + ".json")
+
+    def put_chunk(self, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+
+        # 摘要按未压缩内容计算，切换压缩方式后已有的块仍可复用
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(compress_bytes(data, self.compression))
+            os.replace(temp_path, path)
+        return digest
+
+    def get_chunk(self, digest):
+        return read_json(self.object_path(digest))
+
+    def put_history(self, history):
+        rounds = history.get('rounds', [])
+        offsets = [0]
+        for count in history.get('counts', []):
+            offsets.append(offsets[-1] + count)
+
+        digests = []
+        cache = {}
+        for start in range(0, len(rounds), HISTORY_CHUNK_SIZE):
+            end = min(start + HISTORY_CHUNK_SIZE, len(rounds))
+            block = {key: history[key][start:end] for key in HISTORY_COLUMNS if key != 'members'}
+            block['members'] = history['members'][offsets[start]:offsets[end]]
+            cached = self.history_cache.get(start)
+            # 历史只追加，整块编号与上次相同时直接复用摘要，不必重新序列化和计算哈希
+            if cached and cached[0] == block:
+                digest = cached[1]
+            else:
+                digest = self.put_chunk(block)
+            cache[start] = (block, digest)
+            digests.append(digest)
+        self.history_cache = cache
+        return digests
+
+    def put_roster(self, students):
+        return [self.put_chunk(chunk) for chunk in chunk_roster(students)]
+
+    @timed("写入备份")
+    def write_backup(self, manifest_path, state, metadata=None):
+        metadata = metadata or {}
+        weights = state.get('weights', {})
+        weight_chunks = [
+            self.put_chunk([[name, weights[name]] for name in chunk])
+            for chunk in chunk_roster(sorted(weights))
+        ]
+
+        manifest = {
+            **metadata,
+            'format': BACKUP_FORMAT,
+            'round': state.get('round', 1),
+            'history_modes': state.get('history', {}).get('mode_names', []),
+            'chunks': {
+                'students': self.put_roster(state.get('students', [])),
+                'selected': self.put_roster(state.get('selected', [])),
+                'unselected': self.put_roster(state.get('unselected', [])),
+                'history': self.put_history(state.get('history', {})),
+                'weights': weight_chunks,
+                'import_history': [self.put_chunk(record) for record in state.get('import_history', [])]
+            }
+        }
+        data = encode_json(manifest, self.compression)
+        write_bytes_atomic(manifest_path, data)
+        self.writes_since_gc += 1
+
+        file_name = os.path.basename(manifest_path)
+        return {
+            'id': metadata.get('backup_id', file_name[:-len(".json")]),
+            'file': file_name,
+            'timestamp': metadata.get('timestamp', '未知'),
+            'total_students': len(state.get('selected', [])) + len(state.get('unselected', [])),
+            'round': manifest['round'],
+            'size': len(data),
+            'checksum': hashlib.sha256(data).hexdigest()
+        }
+
+    def backup_path(self, entry):
+        return os.path.join(self.root, entry['file'])
+
+    def load_index(self):
+        with self.lock:
+            if self.index is None:
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as file:
+                        self.index = json.load(file)['backups']
+                except (OSError, ValueError, KeyError):
+                    self.index = self.rebuild_index()
+                    self.save_index()
+            return self.index
+
+    def save_index(self):
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            write_json_atomic(self.index_path, {'version': 1, 'backups': self.index or []})
+
+    def rebuild_index(self):
+        if not os.path.exists(self.root):
+            return []
+
+        found = []
+        for name in os.listdir(self.root):
+            if not is_backup_file(name):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+                manifest = json.loads(decompress_bytes(data).decode('utf-8'))
+            except (OSError, ValueError, EOFError):
+                continue
+
+            if 'total_students' in manifest:
+                total_students = manifest['total_students']
+            else:
+                total_students = len(manifest.get('selected', [])) + len(manifest.get('unselected', []))
+            found.append((os.path.getctime(path), {
+                'id': manifest.get('backup_id', name[:-len(".json")]),
+                'file': name,
+                'timestamp': manifest.get('timestamp', '未知'),
+                'total_students': total_students,
+                'round': manifest.get('round', 1),
+                'size': len(data),
+                'checksum': hashlib.sha256(data).hexdigest()
+            }))
+
+        found.sort(key=lambda item: item[0])
+        return [entry for _, entry in found]
+
+    def list_backups(self):
+        with self.lock:
+            return list(self.load_index())
+
+    def find_entry(self, manifest_path):
+        name = os.path.basename(manifest_path)
+        for entry in self.list_backups():
+            if entry['file'] == name:
+                return entry
+        return None
+
+    def create_backup(self, backup_id, state, metadata, max_backups):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, backup_id + ".json")
+        entry = self.write_backup(path, state, {**metadata, 'backup_id': backup_id})
+
+        with self.lock:
+            self.load_index().append(entry)
+            self.rotate(max_backups)
+        return entry
+
+    @timed("备份轮转")
+    def rotate(self, max_backups):
+        with self.lock:
+            entries = self.load_index()
+            removed = []
+            while len(entries) > max_backups:
+                removed.append(entries.pop(0))
+            self.save_index()
+
+        for entry in removed:
+            try:
+                os.remove(self.backup_path(entry))
+            except FileNotFoundError:
+                pass
+
+        # 回收需要扫描全部清单和数据块，只按写入次数定期执行；被删除备份独占的数据块会保留到下次回收
+        if self.writes_since_gc >= self.gc_interval:
+            self.collect_garbage()
+        return removed
+
+    def delete_backup(self, manifest_path):
+        with self.lock:
+            entry = self.find_entry(manifest_path)
+            if entry:
+                self.index.remove(entry)
+                self.save_index()
+        os.remove(manifest_path)
+
+    def verify(self, manifest_path):
+        entry = self.find_entry(manifest_path)
+        if not entry:
+            return True
+        with open(manifest_path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest() == entry['checksum']
+
+    def manifest_paths(self):
+        return [self.backup_path(entry) for entry in self.list_backups()] + self.extra_manifests
+
+    def read_backup(self, manifest_path):
+        manifest = read_json(manifest_path)
+
+        if manifest.get('format') != BACKUP_FORMAT:
+            return manifest
+
+        chunks = manifest['chunks']
+        data = {key: value for key, value in manifest.items() if key not in ('format', 'chunks', 'history_modes')}
+        for key in ('selected', 'unselected'):
+            data[key] = [item for digest in chunks.get(key, []) for item in self.get_chunk(digest)]
+        if 'students' in chunks:
+            data['students'] = [item for digest in chunks['students'] for item in self.get_chunk(digest)]
+            blocks = [self.get_chunk(digest) for digest in chunks.get('history', [])]
+            data['history'] = {key: [item for block in blocks for item in block[key]] for key in HISTORY_COLUMNS}
+            data['history']['mode_names'] = manifest.get('history_modes', [])
+        else:
+            # 旧版备份按姓名保存每条历史记录
+            data['history'] = [item for digest in chunks.get('history', []) for item in self.get_chunk(digest)]
+        data['weights'] = {
+            name: weight for digest in chunks.get('weights', []) for name, weight in self.get_chunk(digest)
+        }
+        data['import_history'] = [self.get_chunk(digest) for digest in chunks.get('import_history', [])]
+        return data
+
+    def referenced_digests(self, manifest_path):
+        try:
+            manifest = read_json(manifest_path)
+        except (OSError, ValueError, EOFError):
+            return set()
+
+        if manifest.get('format') != BACKUP_FORMAT:
+            return set()
+        return {digest for digests in manifest['chunks'].values() for digest in digests}
+
+    @timed("清理备份块")
+    def collect_garbage(self, manifest_paths=None):
+        if manifest_paths is None:
+            manifest_paths = self.manifest_paths()
+        self.writes_since_gc = 0
+        if not os.path.exists(self.objects_dir):
+            return 0
+
+        live = set()
+        for manifest_path in manifest_paths:
+            live |= self.referenced_digests(manifest_path)
+
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if not name.endswith(".json"):
+                    continue
+                if prefix + name[:-len(".json")] not in live:
+                    os.remove(os.path.join(prefix_dir, name))
+                    removed += 1
+        return removed
@@ -0,0 +1,331 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from lottery_backup import BackupStore
+from lottery_engine import LotteryEngine, MODE_NORMAL, MODE_WEIGHTED, MODE_FAIR
+from lottery_reports import ReportData
+from lottery_search import SearchSession
+from lottery_sqlite import SqliteStore
+from lottery_storage import COMPRESSION_GZIP, JournalStore
+
+try:
+    from tkinter import ttk
+    from main import CheckboxTreeview
+except ImportError:
+    CheckboxTreeview = None
+
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+DEFAULT_SIZES = "1k,10k,100k"
+DEFAULT_REPEAT = 20
+DRAW_COUNT = 5
+MAX_HISTORY_ROUNDS = 20000
+REGRESSION_TOLERANCE = 0.25
+# 耗时太短的项目波动很大，绝对增长低于该值时不算回退
+MIN_DELTA_MS = 1.0
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔"
+GIVEN_NAMES = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚华建国文辉力鹏宇浩然子涵欣怡梓轩一诺雨桐"
+
+
+def synthetic_names(count, rng):
+    # 随机姓名后附加序号，保证名单中没有重复
+    names = []
+    for i in range(count):
+        given = "".join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2)))
+        names.append(f"{rng.choice(SURNAMES)}{given}{i}")
+    return names
+
+
+def build_engine(size, seed=0):
+    rng = random.Random(seed)
+    engine = LotteryEngine(rng=random.Random(seed))
+    engine.add_students(synthetic_names(size, rng))
+
+    # 历史轮次约为人数的十分之一，每轮抽 5 人，最多抽走一半学生
+    rounds = min(size // 10, MAX_HISTORY_ROUNDS)
+    drawn = rng.sample(engine.last_round_unselected.as_list(), rounds * DRAW_COUNT)
+    modes = (MODE_NORMAL, MODE_WEIGHTED, MODE_FAIR)
+    for i in range(rounds):
+        engine.commit_draw(drawn[i * DRAW_COUNT:(i + 1) * DRAW_COUNT], rng.choice(modes),
+                           timestamp=f"2024-09-{1 + i % 28:02d} 08:00:00")
+
+    weighted = rng.sample(engine.last_round_unselected.as_list(), len(engine.last_round_unselected) // 10)
+    engine.set_weights({student: rng.randint(1, 10) for student in weighted})
+    engine.clear_undo()
+    return engine
+
+
+if CheckboxTreeview is not None:
+    class TreeviewStub(ttk.Treeview):
+        # 只替换真正调用 Tk 的方法，CheckboxTreeview 的渲染和比对逻辑原样运行
+        def __init__(self, master=None, **kwargs):
+            pass
+
+        def bind(self, *args, **kwargs):
+            pass
+
+        def insert(self, parent, index, iid=None, **kw):
+            return iid
+
+        def delete(self, *items):
+            pass
+
+        def move(self, item, parent, index):
+            pass
+
+        def item(self, item, option=None, **kw):
+            pass
+
+        def yview_moveto(self, fraction):
+            pass
+
+    class BenchTree(CheckboxTreeview, TreeviewStub):
+        def create_checkbox_image(self, checked):
+            return None
+
+
+def tree_pair(virtual):
+    return BenchTree(virtual=virtual), BenchTree(virtual=virtual)
+
+
+def row_factories(engine):
+    def selected_row_values(student):
+        record = engine.first_selection_record(student)
+        if record:
+            return (str(record["round"]), record["timestamp"], engine.get_student_weight(student))
+        return ("未知", "未知", engine.get_student_weight(student))
+
+    def unselected_row_values(student):
+        return ("未抽中", engine.get_student_weight(student))
+
+    return selected_row_values, unselected_row_values
+
+
+def search_queries(engine, rng):
+    sample = rng.choice(engine.last_round_unselected.as_list())
+    return [sample[0], sample[:2], sample[-3:]]
+
+
+def benchmarks(engine, workdir, repeat):
+    rng = random.Random(1)
+    selected_row_values, unselected_row_values = row_factories(engine)
+    queries = search_queries(engine, rng)
+    light = repeat
+    heavy = max(1, repeat // 5)
+
+    json_store = JournalStore(os.path.join(workdir, "state.json"), compression=COMPRESSION_GZIP)
+    sqlite_store = SqliteStore(os.path.join(workdir, "state.db"), legacy_file=os.path.join(workdir, "missing.json"))
+    sqlite_store.load()
+    backup_store = BackupStore(os.path.join(workdir, "backups"), compression=COMPRESSION_GZIP)
+    unselected = engine.last_round_unselected
+
+    def weighted_cold():
+        # 修改一个权重后再抽取，包含重建累计权重树的开销
+        engine.set_weight(unselected[0], rng.randint(1, 10))
+        engine.weighted_lottery(DRAW_COUNT)
+
+    def refresh_trees(trees):
+        selected_tree, unselected_tree = trees
+        selected_tree.set_rows(engine.selected_students, selected_row_values)
+        unselected_tree.set_rows(engine.last_round_unselected, unselected_row_values)
+
+    def search():
+        for query in queries:
+            SearchSession(engine.search_index).search(query, engine.last_round_unselected)
+
+    def save_json():
+        json_store.commit_snapshot(engine.to_dict(), COMPRESSION_GZIP)
+
+    def load_json():
+        data, ops = JournalStore(json_store.state_file).load()
+        LotteryEngine().load_dict(data)
+
+    def save_sqlite():
+        sqlite_store.commit_snapshot(engine.to_dict())
+
+    def load_sqlite():
+        LotteryEngine().load_dict(sqlite_store.read_state())
+
+    backup_ids = iter(range(10 ** 9))
+
+    def backup_rotate():
+        engine.skip_round()
+        backup_store.create_backup(f"backup_{next(backup_ids):06d}", engine.to_dict(), {}, 3)
+
+    items = [
+        ("plain_draw", lambda: engine.pick(DRAW_COUNT, MODE_NORMAL), light),
+        ("weighted_draw", lambda: engine.weighted_lottery(DRAW_COUNT), light),
+        ("weighted_draw_cold", weighted_cold, heavy),
+        ("fair_draw", lambda: engine.fair_lottery(DRAW_COUNT), heavy),
+        ("draw_commit", lambda: engine.draw(DRAW_COUNT), light),
+        ("smart_balance", engine.smart_balance, heavy),
+        ("report_snapshot", lambda: ReportData(engine), light)
+    ]
+    if CheckboxTreeview is not None:
+        virtual_trees = tree_pair(True)
+        full_trees = tree_pair(False)
+        items += [
+            ("tree_refresh_virtual", lambda: refresh_trees(virtual_trees), light),
+            ("tree_refresh_full", lambda: refresh_trees(full_trees), heavy)
+        ]
+    return items + [
+        ("search", search, light),
+        ("save_json", save_json, heavy),
+        ("load_json", load_json, heavy),
+        ("save_sqlite", save_sqlite, heavy),
+        ("load_sqlite", load_sqlite, heavy),
+        ("backup_rotate", backup_rotate, heavy)
+    ]
+
+
+def measure(func, repeat):
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+
+    # 内存峰值单独再跑一次测量，避免 tracemalloc 拖慢计时
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    mean = sum(times) / len(times)
+    return {
+        'repeat': repeat,
+        'mean_ms': mean,
+        'min_ms': times[0],
+        'p95_ms': times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        'ops_per_sec': 1000 / mean if mean else 0.0,
+        'peak_kb': peak / 1024
+    }
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    # Linux 下 ru_maxrss 的单位是 KB，macOS 下是字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else peak
+
+
+def run_size(label, size, repeat, only=None):
+    results = {}
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = build_engine(size)
+    setup_s = time.perf_counter() - start
+    engine_kb = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    print(f"[{label}] {size} 人，{len(engine.lottery_history)} 轮历史，"
+          f"构建 {setup_s:.1f} 秒，引擎内存 {engine_kb / 1024:.1f} MB")
+
+    if CheckboxTreeview is None:
+        print("  未安装 tkinter，跳过列表刷新项目")
+
+    workdir = tempfile.mkdtemp(prefix="lottery_bench_")
+    try:
+        for name, func, count in benchmarks(engine, workdir, repeat):
+            if only and name not in only:
+                continue
+            result = measure(func, count)
+            results[f"{label}/{name}"] = result
+            print(f"  {name:<22}{result['mean_ms']:>12.3f} ms{result['ops_per_sec']:>12.1f} 次/秒"
+                  f"{result['peak_kb']:>12.0f} KB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    peak_rss = peak_rss_kb()
+    if peak_rss:
+        print(f"  进程内存峰值 {peak_rss / 1024:.1f} MB")
+    results[f"{label}/engine"] = {'setup_s': setup_s, 'engine_kb': engine_kb, 'peak_rss_kb': peak_rss}
+    return results
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE, min_delta=MIN_DELTA_MS):
+    regressions = []
+    print(f"\n与基线对比 (允许波动 {tolerance:.0%}，且增长超过 {min_delta:g} ms 才算回退):")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or 'mean_ms' not in result or 'mean_ms' not in base:
+            continue
+        ratio = result['mean_ms'] / base['mean_ms'] if base['mean_ms'] else 1.0
+        regressed = ratio > 1 + tolerance and result['mean_ms'] - base['mean_ms'] > min_delta
+        marker = "  <-- 回退" if regressed else ""
+        print(f"  {key:<30}{base['mean_ms']:>12.3f} -> {result['mean_ms']:>12.3f} ms  x{ratio:.2f}{marker}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file).get('results', {})
+
+
+def save_results(path, results):
+    data = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽签系统性能基准测试（无需图形界面）")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"名单规模，逗号分隔，可选 {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="轻量项目的重复次数")
+    parser.add_argument("--only", help="只运行指定项目，逗号分隔")
+    parser.add_argument("--output", help="把结果写入 JSON 文件，可作为以后的基线")
+    parser.add_argument("--baseline", help="与之前保存的结果对比，出现回退时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="允许的耗时增长比例")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA_MS, help="计为回退所需的最小耗时增长（毫秒）")
+    args = parser.parse_args(argv)
+
+    labels = [label.strip().lower() for label in args.sizes.split(",") if label.strip()]
+    unknown = [label for label in labels if label not in SIZES]
+    if unknown:
+        parser.error(f"未知的名单规模: {', '.join(unknown)}")
+    only = set(args.only.split(",")) if args.only else None
+
+    results = {}
+    for label in labels:
+        results.update(run_size(label, SIZES[label], max(1, args.repeat), only))
+
+    if args.output:
+        save_results(args.output, results)
+        print(f"\n结果已保存到: {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, load_baseline(args.baseline), args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能回退")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+CONFIG_FILE = "lottery_config.json"
+LOCK_MESSAGE = "存档正在被其他抽签程序写入，请稍后重试，或使用 --wait 延长等待时间"
+MODE_ALIASES = {
+    "normal": "常规",
+    "weighted": "权重模式",
+    "fair": "公平模式"
+}
+
+
+def load_config(path=CONFIG_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+class CliSession:
+    # 命令行与图形界面共用同一份存档和操作日志，但写入都在当前线程同步完成
+    def __init__(self, config):
+        from lottery_engine import LotteryEngine
+        from lottery_storage import COMPRESSION_CHOICES, COMPRESSION_NONE
+
+        compression = config.get('compression', COMPRESSION_NONE)
+        if compression not in COMPRESSION_CHOICES:
+            compression = COMPRESSION_NONE
+
+        if config.get('storage_backend', 'json') == 'sqlite':
+            from lottery_sqlite import SqliteStore
+            self.storage = SqliteStore(compression=compression)
+        else:
+            from lottery_storage import JournalStore
+            self.storage = JournalStore(compression=compression)
+
+        self.engine = LotteryEngine()
+        self.settings = {}
+        self.last_updated = '未知'
+
+    def load(self):
+        data, ops = self.storage.load()
+        if data is not None or ops:
+            data = data or {}
+            self.engine.load_dict(data)
+            for op in ops:
+                self.engine.apply(op)
+            self.settings = data.get('settings', {})
+            self.last_updated = data.get('last_updated', '未知')
+        if ops or self.storage.needs_compaction():
+            self.save()
+        self.engine.add_observer(self.storage.append)
+        return self
+
+    def save(self):
+        self.storage.write_snapshot({
+            **self.engine.to_dict(),
+            'settings': self.settings,
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    def close(self):
+        if self.storage.needs_compaction():
+            self.save()
+
+
+def open_session():
+    return CliSession(load_config()).load()
+
+
+def run_draw(args):
+    session = open_session()
+    engine = session.engine
+    mode = MODE_ALIASES.get(args.mode, args.mode)
+    try:
+        engine.validate_count(args.count)
+        if args.dry_run:
+            selected = engine.pick(args.count, mode)
+        else:
+            selected = engine.draw(args.count, mode)
+    except ValueError as e:
+        print(f"抽签时出错: {str(e)}", file=sys.stderr)
+        return 1
+    session.close()
+
+    if args.json:
+        print(json.dumps({
+            'round': engine.current_round - (0 if args.dry_run else 1),
+            'mode': mode,
+            'selected': selected,
+            'committed': not args.dry_run
+        }, ensure_ascii=False))
+    else:
+        print("\n".join(selected))
+    return 0
+
+
+def run_import(args):
+    from lottery_importer import RosterImporter, detect_encoding, is_csv, read_header, ENCODING_AUTO
+
+    encoding = args.encoding or ENCODING_AUTO
+    has_header = not args.no_header
+    column = None
+    if is_csv(args.file):
+        if args.column:
+            column = args.column - 1
+        elif has_header:
+            header = read_header(args.file, detect_encoding(args.file) if encoding == ENCODING_AUTO else encoding)
+            # 与导入对话框一致，优先选择表头中带“姓名”或 name 的列
+            name_columns = [i for i, name in enumerate(header) if "姓名" in name or "name" in name.lower()]
+            column = name_columns[0] if name_columns else 0
+
+    session = open_session()
+    try:
+        importer = RosterImporter(session.engine, args.file, encoding, column=column, has_header=has_header)
+        added, duplicates = importer.run()
+    except Exception as e:
+        print(f"读取文件时出错: {str(e)}", file=sys.stderr)
+        return 1
+
+    if added:
+        session.engine.record_import(os.path.basename(args.file), os.path.abspath(args.file), added)
+    session.close()
+    print(f"成功导入 {len(added)} 名学生，跳过 {duplicates} 个重复项")
+    return 0
+
+
+def run_job(job):
+    job.run()
+    if job.error is not None:
+        raise job.error
+    return job.result
+
+
+def run_export(args):
+    from lottery_reports import ReportData, export_results_job, export_unselected_job
+
+    session = open_session()
+    data = ReportData(session.engine)
+    builder = export_results_job if args.kind == "results" else export_unselected_job
+    try:
+        run_job(builder(data, args.output))
+    except Exception as e:
+        print(f"导出时出错: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"已导出到: {args.output}")
+    return 0
+
+
+def run_report(args):
+    from lottery_reports import ReportData, export_report_job
+
+    session = open_session()
+    data = ReportData(session.engine)
+    if args.output:
+        try:
+            run_job(export_report_job(data, args.output))
+        except Exception as e:
+            print(f"导出报告时出错: {str(e)}", file=sys.stderr)
+            return 1
+        print(f"报告已导出到: {args.output}")
+        return 0
+
+    frequency = data.frequency()
+    if args.top:
+        frequency = frequency[:args.top]
+    for line in data.report_lines(frequency):
+        print(line)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="抽签系统命令行模式，不需要图形界面")
+    parser.add_argument("--data-dir", help="存档所在目录，默认为当前目录")
+    parser.add_argument("--wait", type=float, help="存档被占用时最多等待的秒数，默认 5 秒")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    draw = commands.add_parser("draw", help="抽取学生并记入历史")
+    draw.add_argument("--count", type=int, default=1, help="抽取人数")
+    draw.add_argument("--mode", default="normal", choices=tuple(MODE_ALIASES) + tuple(MODE_ALIASES.values()),
+                      help="抽签模式: normal、weighted、fair")
+    draw.add_argument("--dry-run", action="store_true", help="只预览结果，不写入存档")
+    draw.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    draw.set_defaults(handler=run_draw)
+
+    import_parser = commands.add_parser("import", help="从文本或 CSV 文件导入名单")
+    import_parser.add_argument("file", help="名单文件")
+    import_parser.add_argument("--encoding", help="文件编码，默认自动检测")
+    import_parser.add_argument("--column", type=int, help="CSV 中姓名所在的列（从 1 开始）")
+    import_parser.add_argument("--no-header", action="store_true", help="CSV 首行不是表头")
+    import_parser.set_defaults(handler=run_import)
+
+    export = commands.add_parser("export", help="导出抽签结果或未抽中名单")
+    export.add_argument("kind", choices=("results", "unselected"), help="导出内容")
+    export.add_argument("output", help="输出文件，扩展名为 .csv 时导出 CSV")
+    export.set_defaults(handler=run_export)
+
+    report = commands.add_parser("report", help="输出统计报告")
+    report.add_argument("--output", help="写入文件而不是打印")
+    report.add_argument("--top", type=int, help="只显示抽中次数最多的前几名")
+    report.set_defaults(handler=run_report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.data_dir:
+        os.chdir(args.data_dir)
+
+    from lottery_storage import StateLock, LOCK_WAIT_SECONDS
+    lock = StateLock()
+    if not lock.acquire(timeout=LOCK_WAIT_SECONDS if args.wait is None else max(0, args.wait)):
+        print(LOCK_MESSAGE, file=sys.stderr)
+        return 1
+    try:
+        return args.handler(args)
+    finally:
+        lock.release()
@@ -0,0 +1,542 @@
+import random
+from array import array
+from collections import deque
+from datetime import datetime
+
+from lottery_metrics import timed
+from lottery_registry import HistoryLog, StudentRegistry, is_compact_state, parse_timestamp, format_timestamp
+from lottery_roster import OrderedRoster
+from lottery_sampling import weighted_sample
+from lottery_search import SearchIndex
+from lottery_weights import DEFAULT_WEIGHT, WeightTable
+
+MODE_NORMAL = "常规"
+MODE_WEIGHTED = "权重模式"
+MODE_FAIR = "公平模式"
+MODE_QUICK = "一键抽取"
+
+MIN_WEIGHT = 1
+MAX_WEIGHT = 10
+
+UNDO_LIMIT = 100
+
+OP_LABELS = {
+    "draw": "抽签",
+    "skip": "跳过本轮",
+    "move": "移动学生",
+    "add": "添加学生",
+    "remove": "删除学生",
+    "import": "导入名单",
+    "replace_unselected": "调整名单",
+    "replace_pool": "调整名单",
+    "weights": "设置权重",
+    "reset_weights": "重置权重",
+    "reset": "重置系统"
+}
+
+
+class LotteryEngine:
+    def __init__(self, rng=None):
+        self.rng = rng or random
+        self.selected_students = OrderedRoster()
+        self.last_round_unselected = OrderedRoster()
+        self.registry = StudentRegistry()
+        self.lottery_history = HistoryLog(self.registry)
+        self.weight_table = WeightTable(self.registry)
+        self.import_history = []
+        self.current_round = 1
+        self.selection_count = array('I')
+        self.first_selection = {}
+        self.search_index = SearchIndex()
+        self.observers = []
+        self.undo_stack = deque(maxlen=UNDO_LIMIT)
+        self.redo_stack = []
+        # 每次修改状态都加一，界面缓存按它判断是否过期
+        self.version = 0
+
+    @property
+    def total_count(self):
+        return len(self.selected_students) + len(self.last_round_unselected)
+
+    def contains(self, student_name):
+        return student_name in self.last_round_unselected or student_name in self.selected_students
+
+    @property
+    def student_weights(self):
+        return self.weight_table.weights
+
+    def get_student_weight(self, student_name):
+        return self.weight_table.get(student_name)
+
+    def validate_count(self, num_to_select):
+        if num_to_select <= 0:
+            raise ValueError("抽取人数必须大于0")
+        if num_to_select > len(self.last_round_unselected):
+            raise ValueError(f"抽取人数不能超过未抽中人数 {len(self.last_round_unselected)}")
+
+    @timed("抽签选取")
+    def pick(self, num_to_select, mode=MODE_NORMAL):
+        if mode == MODE_WEIGHTED:
+            return self.weighted_lottery(num_to_select)
+        if mode == MODE_FAIR:
+            return self.fair_lottery(num_to_select)
+        return self.rng.sample(self.last_round_unselected.as_list(), num_to_select)
+
+    def weighted_lottery(self, num_to_select):
+        sampler, students = self.weight_table.sampler_for(self.last_round_unselected)
+        return [students[index] for index in sampler.sample(num_to_select, self.rng, restore=True)]
+
+    def fair_lottery(self, num_to_select):
+        students = self.last_round_unselected.as_list()
+        selection_count = self.selection_counts(students)
+
+        max_count = max(selection_count.values()) if selection_count else 1
+        weights = [max_count - selection_count[student] + 1 for student in students]
+        return self._sample_without_replacement(students, weights, num_to_select)
+
+    def _sample_without_replacement(self, students, weights, num_to_select):
+        return weighted_sample(students, weights, num_to_select, self.rng)
+
+    def selection_counts(self, students):
+        counts = self.selection_count
+        ids = self.registry.ids
+        size = len(counts)
+        result = {}
+        for student in students:
+            student_id = ids.get(student)
+            result[student] = counts[student_id] if student_id is not None and student_id < size else 0
+        return result
+
+    def first_selection_record(self, student_name):
+        student_id = self.registry.id_of(student_name)
+        index = self.first_selection.get(student_id)
+        return None if index is None else self.lottery_history.record(index)
+
+    def _index_record(self, index):
+        # 抽中次数按学生编号存放在数组中，首次抽中只记录历史下标
+        counts = self.selection_count
+        missing = len(self.registry) - len(counts)
+        if missing > 0:
+            counts.extend(array('I', [0]) * missing)
+        first_selection = self.first_selection
+        for student_id in self.lottery_history.member_ids(index):
+            counts[student_id] += 1
+            if student_id not in first_selection:
+                first_selection[student_id] = index
+
+    def _rebuild_indexes(self):
+        self.selection_count = array('I', [0]) * len(self.registry)
+        self.first_selection = {}
+        for index in range(len(self.lottery_history)):
+            self._index_record(index)
+
+        self.search_index.rebuild(self.last_round_unselected)
+        self.search_index.add(self.selected_students)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def commit(self, op):
+        result = self._commit(op, self._inverse(op))
+        self.redo_stack.clear()
+        return result
+
+    def _commit(self, op, inverse=None):
+        result = self.apply(op)
+        if inverse is not None:
+            self.undo_stack.append((op, inverse))
+        for observer in list(self.observers):
+            observer(op)
+        return result
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        op, inverse = self.undo_stack.pop()
+        self._commit({"op": "batch", "ops": inverse()})
+        self.redo_stack.append(op)
+        return op
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        op = self.redo_stack.pop()
+        self._commit(op, self._inverse(op))
+        return op
+
+    def clear_undo(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def _inverse(self, op):
+        # 撤销记录只保存本次操作涉及的少量数据，真正的逆操作在撤销时才生成
+        return getattr(self, "_inverse_" + op["op"])(op)
+
+    @staticmethod
+    def _removal(pool, students):
+        # 位置键会在 replace 时重新编号，所以记录的是操作前的列表下标；
+        # 撤销按后进先出进行，届时名单与本次操作刚完成时完全一致
+        return sorted((pool.index_of(student), student) for student in dict.fromkeys(students) if student in pool)
+
+    def _restore_op(self, pool_name, removed):
+        pool = self.pool(pool_name)
+        remaining = iter(pool.as_list())
+        students = []
+        for index, student in removed:
+            if student in pool:
+                continue
+            while len(students) < index:
+                student_before = next(remaining, None)
+                if student_before is None:
+                    break
+                students.append(student_before)
+            students.append(student)
+        students.extend(remaining)
+        return {"op": "replace_pool", "pool": pool_name, "students": students}
+
+    def _inverse_draw(self, op):
+        removed = self._removal(self.last_round_unselected, op["selected"])
+        added = [student for _, student in removed if student not in self.selected_students]
+        round_before = self.current_round
+        return lambda: [
+            {"op": "remove", "pool": "selected", "students": added},
+            self._restore_op("unselected", removed),
+            {"op": "pop_history"},
+            {"op": "set_round", "round": round_before}
+        ]
+
+    def _inverse_skip(self, op):
+        round_before = self.current_round
+        return lambda: [{"op": "set_round", "round": round_before}]
+
+    def _inverse_move(self, op):
+        source_name = "unselected" if op["to"] == "selected" else "selected"
+        target = self.pool(op["to"])
+        removed = self._removal(self.pool(source_name), op["students"])
+        added = [student for _, student in removed if student not in target]
+        return lambda: [
+            {"op": "remove", "pool": op["to"], "students": added},
+            self._restore_op(source_name, removed)
+        ]
+
+    def _inverse_add(self, op):
+        added = [student for student in dict.fromkeys(op["students"]) if student not in self.last_round_unselected]
+        return lambda: [{"op": "remove", "pool": "unselected", "students": added}]
+
+    def _inverse_remove(self, op):
+        removed = self._removal(self.pool(op["pool"]), op["students"])
+        return lambda: [self._restore_op(op["pool"], removed)]
+
+    def _inverse_import(self, op):
+        # 带 add 标记的导入会同时把学生加入名单，撤销时一并移除；旧日志中的导入记录只含记录本身
+        added = [student for student in dict.fromkeys(op["students"]) if not self.contains(student)] if op.get("add") else []
+        return lambda: [
+            {"op": "remove", "pool": "unselected", "students": added},
+            {"op": "pop_import"}
+        ]
+
+    def _inverse_replace_unselected(self, op):
+        students = self.last_round_unselected.as_list()
+        return lambda: [{"op": "replace_pool", "pool": "unselected", "students": list(students)}]
+
+    def _inverse_replace_pool(self, op):
+        students = self.pool(op["pool"]).as_list()
+        return lambda: [{"op": "replace_pool", "pool": op["pool"], "students": list(students)}]
+
+    def _inverse_weights(self, op):
+        previous = {student: self.student_weights.get(student) for student in op["weights"]}
+        return lambda: [
+            {"op": "unset_weights", "students": [s for s, w in previous.items() if w is None]},
+            {"op": "weights", "weights": {s: w for s, w in previous.items() if w is not None}}
+        ]
+
+    def _inverse_reset_weights(self, op):
+        weights = dict(self.student_weights)
+        return lambda: [{"op": "weights", "weights": weights}]
+
+    def _inverse_reset(self, op):
+        # 重置只会整体替换历史对象；权重字典和导入记录之后仍会被原地修改，需要在此复制
+        unselected = self.last_round_unselected.as_list()
+        selected = self.selected_students.as_list()
+        round_before = self.current_round
+        history = self.lottery_history
+        weights = dict(self.student_weights)
+        imports = list(self.import_history)
+        return lambda: [{"op": "load", "state": self._state_dict(
+            history.registry, unselected, selected, round_before, history, weights, imports)}]
+
+    def apply(self, op):
+        self.version += 1
+        return getattr(self, "_apply_" + op["op"])(op)
+
+    def pool(self, name):
+        return self.selected_students if name == "selected" else self.last_round_unselected
+
+    def _apply_draw(self, op):
+        version_before = self.last_round_unselected.version
+        self.last_round_unselected.move_to(self.selected_students, op["selected"])
+        self.weight_table.advance(self.last_round_unselected, version_before, op["selected"])
+
+        history = self.lottery_history
+        index = history.append(op["round"], self.registry.intern_many(op["selected"]),
+                               parse_timestamp(op["timestamp"]), op["mode"])
+        self._index_record(index)
+        self.current_round = op["round"] + 1
+        return history.record(index)
+
+    def _apply_skip(self, op):
+        self.current_round += 1
+
+    def _apply_move(self, op):
+        target = self.pool(op["to"])
+        source = self.last_round_unselected if target is self.selected_students else self.selected_students
+        return source.move_to(target, op["students"])
+
+    def _apply_add(self, op):
+        added = self.last_round_unselected.extend(op["students"])
+        # 加入名单时就分配编号，编号顺序与名单顺序一致，存档压缩效果更好
+        self.registry.intern_many(added)
+        self.search_index.add(added)
+        return added
+
+    def _apply_remove(self, op):
+        return self.pool(op["pool"]).remove_many(op["students"])
+
+    def _apply_import(self, op):
+        if op.get("add"):
+            self._apply_add(op)
+        record = {
+            'name': op['name'],
+            'path': op['path'],
+            'students': self.registry.intern_many(op['students']),
+            'timestamp': parse_timestamp(op['timestamp'])
+        }
+        self.import_history.append(record)
+        return record
+
+    def _apply_replace_unselected(self, op):
+        self.last_round_unselected.replace(op["students"])
+        self.search_index.add(self.last_round_unselected)
+
+    def _apply_weights(self, op):
+        self.weight_table.update(op["weights"])
+
+    def _apply_reset_weights(self, op):
+        self.weight_table.reset()
+
+    def _apply_replace_pool(self, op):
+        pool = self.pool(op["pool"])
+        pool.replace(op["students"])
+        self.search_index.add(pool)
+
+    def _apply_batch(self, op):
+        for child in op["ops"]:
+            self.apply(child)
+
+    def _apply_pop_history(self, op):
+        index = len(self.lottery_history) - 1
+        member_ids = self.lottery_history.pop()
+        counts = self.selection_count
+        for student_id in member_ids:
+            counts[student_id] -= 1
+            if self.first_selection.get(student_id) == index:
+                del self.first_selection[student_id]
+        return member_ids
+
+    def _apply_set_round(self, op):
+        self.current_round = op["round"]
+
+    def _apply_pop_import(self, op):
+        return self.import_history.pop()
+
+    def _apply_unset_weights(self, op):
+        self.weight_table.unset(op["students"])
+
+    def _apply_load(self, op):
+        self._load_state(op["state"])
+
+    def _apply_reset(self, op):
+        self.selected_students.clear()
+        self.last_round_unselected.clear()
+        self.lottery_history = HistoryLog(self.registry)
+        self.current_round = 1
+        self._rebuild_indexes()
+        if op.get("clear_weights"):
+            self.weight_table.reset()
+
+    def commit_draw(self, selected, mode=MODE_NORMAL, timestamp=None):
+        return self.commit({
+            "op": "draw",
+            "round": self.current_round,
+            "selected": list(selected),
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "mode": mode
+        })
+
+    def draw(self, num_to_select, mode=MODE_NORMAL):
+        self.validate_count(num_to_select)
+        selected = self.pick(num_to_select, mode)
+        self.commit_draw(selected, mode)
+        return selected
+
+    def skip_round(self):
+        self.commit({"op": "skip"})
+
+    def move_to_selected(self, students):
+        moved = [s for s in dict.fromkeys(students) if s in self.last_round_unselected]
+        if moved:
+            self.commit({"op": "move", "to": "selected", "students": moved})
+        return len(moved)
+
+    def move_to_unselected(self, students):
+        moved = [s for s in dict.fromkeys(students) if s in self.selected_students]
+        if moved:
+            self.commit({"op": "move", "to": "unselected", "students": moved})
+        return len(moved)
+
+    def add_students(self, students):
+        new_students = []
+        seen = set()
+        duplicates = 0
+
+        for student in students:
+            if student in seen or self.contains(student):
+                duplicates += 1
+            else:
+                new_students.append(student)
+                seen.add(student)
+
+        if new_students:
+            self.commit({"op": "add", "students": new_students})
+        return new_students, duplicates
+
+    def record_import(self, name, path, students):
+        return self.commit({
+            "op": "import",
+            'name': name,
+            'path': path,
+            'students': list(students),
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'add': True
+        })
+
+    def find_import(self, name):
+        for record in self.import_history:
+            if record['name'] == name:
+                return {
+                    **record,
+                    'students': self.registry.names_of(record['students']),
+                    'timestamp': format_timestamp(record['timestamp'])
+                }
+        return None
+
+    def replace_unselected(self, students):
+        self.commit({"op": "replace_unselected", "students": list(dict.fromkeys(students))})
+
+    def shuffle(self):
+        students = list(self.last_round_unselected)
+        self.rng.shuffle(students)
+        self.replace_unselected(students)
+
+    def set_weight(self, student_name, weight):
+        if not MIN_WEIGHT <= weight <= MAX_WEIGHT:
+            raise ValueError(f"权重必须在{MIN_WEIGHT}-{MAX_WEIGHT}之间")
+        self.set_weights({student_name: weight})
+
+    def set_weights(self, weights):
+        if weights:
+            self.commit({"op": "weights", "weights": dict(weights)})
+
+    def reset_weights(self):
+        self.commit({"op": "reset_weights"})
+
+    def smart_balance(self):
+        selection_count = self.selection_counts(self.last_round_unselected)
+        self.set_weights({
+            student: max(MIN_WEIGHT, min(MAX_WEIGHT, MAX_WEIGHT - count))
+            for student, count in selection_count.items()
+        })
+
+    def remove_students(self, pool_name, students):
+        if students:
+            self.commit({"op": "remove", "pool": pool_name, "students": list(students)})
+        return len(students)
+
+    def remove_duplicates(self):
+        duplicates = [s for s in self.selected_students if s in self.last_round_unselected]
+        return self.remove_students("unselected", duplicates)
+
+    def remove_empty(self):
+        self.remove_students("selected", [s for s in self.selected_students if not s.strip()])
+        self.remove_students("unselected", [s for s in self.last_round_unselected if not s.strip()])
+
+    def reset(self, clear_weights=False):
+        self.commit({"op": "reset", "clear_weights": clear_weights})
+
+    @staticmethod
+    def _state_dict(registry, unselected, selected, round_num, history, weights, imports):
+        # 存档中每个名字只在 students 中出现一次，名单、历史和导入记录都只保存编号
+        unselected_ids = registry.intern_many(unselected).tolist()
+        selected_ids = registry.intern_many(selected).tolist()
+        return {
+            'students': list(registry.names),
+            'unselected': unselected_ids,
+            'selected': selected_ids,
+            'round': round_num,
+            'history': history.to_dict(),
+            'weights': dict(weights),
+            'import_history': [
+                {**record, 'students': record['students'].tolist()} for record in imports
+            ]
+        }
+
+    def to_dict(self):
+        return self._state_dict(self.registry, self.last_round_unselected.as_list(), self.selected_students.as_list(),
+                                self.current_round, self.lottery_history, self.student_weights, self.import_history)
+
+    def load_dict(self, data):
+        self._load_state(data)
+        self.clear_undo()
+
+    def _load_state(self, data):
+        if is_compact_state(data):
+            registry = StudentRegistry(data['students'])
+            unselected = registry.names_of(data.get('unselected', []))
+            selected = registry.names_of(data.get('selected', []))
+            history = HistoryLog.from_dict(registry, data['history'])
+            imports = [
+                {**record, 'students': array('i', record['students'])}
+                for record in data.get('import_history', [])
+            ]
+        else:
+            # 兼容按姓名保存的旧存档，载入时转换为编号
+            unselected = data.get('unselected', [])
+            selected = data.get('selected', [])
+            registry = StudentRegistry(unselected)
+            registry.intern_many(selected)
+            history = HistoryLog.from_records(registry, data.get('history', []))
+            imports = [
+                {**record, 'students': registry.intern_many(record['students']),
+                 'timestamp': parse_timestamp(record.get('timestamp'))}
+                for record in data.get('import_history', [])
+            ]
+
+        self.registry = registry
+        self.last_round_unselected.replace(unselected)
+        self.selected_students.replace(selected)
+        self.current_round = data.get('round', 1)
+        self.lottery_history = history
+        self.weight_table = WeightTable(registry, data.get('weights', {}))
+        self.import_history = imports
+        self.version += 1
+        self._rebuild_indexes()
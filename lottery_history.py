@@ -0,0 +1,76 @@
+HISTORY_PAGE_SIZE = 50
+MODE_ALL = "全部"
+
+
+class HistoryPager:
+    def __init__(self, engine, page_size=HISTORY_PAGE_SIZE):
+        self.engine = engine
+        self.page_size = page_size
+        self.mode = MODE_ALL
+        self.page = 0
+        self.matches = None
+        self.matches_key = None
+
+    @property
+    def history(self):
+        return self.engine.lottery_history
+
+    def positions(self):
+        if self.mode == MODE_ALL:
+            return None
+
+        history = self.history
+        # 撤销后再抽一轮，历史长度不变但内容已经不同，所以按引擎的版本号判断
+        key = (self.engine.version, self.mode)
+        if self.matches_key != key:
+            # 只有按模式筛选时才需要扫描一遍模式列，结果缓存到历史变化为止
+            mode_id = history.mode_ids.get(self.mode)
+            self.matches = [i for i, mode in enumerate(history.modes) if mode == mode_id]
+            self.matches_key = key
+        return self.matches
+
+    def __len__(self):
+        positions = self.positions()
+        return len(self.history) if positions is None else len(positions)
+
+    @property
+    def page_count(self):
+        return max(1, (len(self) + self.page_size - 1) // self.page_size)
+
+    def index_at(self, position):
+        positions = self.positions()
+        return position if positions is None else positions[position]
+
+    def record_at(self, position):
+        return self.history.record(self.index_at(position))
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self.page = 0
+
+    def go_to(self, page):
+        self.page = max(0, min(page, self.page_count - 1))
+        return self.page
+
+    def last_page(self):
+        return self.go_to(self.page_count - 1)
+
+    def page_records(self):
+        start = self.page * self.page_size
+        end = min(start + self.page_size, len(self))
+        return [self.record_at(position) for position in range(start, end)]
+
+    def find_round(self, round_num):
+        # 轮次随历史单调递增，二分查找第一条不早于目标轮次的记录
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.history.round_at(self.index_at(middle)) < round_num:
+                low = middle + 1
+            else:
+                high = middle
+        if low >= len(self):
+            return None
+
+        self.go_to(low // self.page_size)
+        return low
@@ -0,0 +1,131 @@
+import codecs
+import csv
+import io
+import os
+
+from lottery_metrics import timed
+
+IMPORT_CHUNK_SIZE = 5000
+SNIFF_BYTES = 64 * 1024
+ENCODING_AUTO = "自动检测"
+ENCODING_CHOICES = (ENCODING_AUTO, "utf-8", "gbk")
+CSV_EXTENSIONS = (".csv",)
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(path):
+    with open(path, 'rb') as file:
+        head = file.read(SNIFF_BYTES)
+
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    try:
+        # 只检查文件开头，末尾可能截断在多字节字符中间，所以不做 final 校验
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gbk"
+
+
+def is_csv(path):
+    return os.path.splitext(path)[1].lower() in CSV_EXTENSIONS
+
+
+def read_header(path, encoding):
+    with open(path, 'r', encoding=encoding, newline='') as file:
+        for row in csv.reader(file):
+            if any(cell.strip() for cell in row):
+                return [cell.strip() for cell in row]
+    return []
+
+
+class RosterImporter:
+    def __init__(self, engine, path, encoding=ENCODING_AUTO, column=None, has_header=False,
+                 chunk_size=IMPORT_CHUNK_SIZE):
+        self.engine = engine
+        self.path = path
+        self.encoding = detect_encoding(path) if encoding == ENCODING_AUTO else encoding
+        self.column = column
+        self.has_header = has_header
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(path) or 1
+        self.added = []
+        self.seen = set()
+        self.duplicates = 0
+        self.lines = 0
+        self.done = False
+        self.raw = None
+        self.rows = None
+
+    def open(self):
+        self.raw = open(self.path, 'rb')
+        text = io.TextIOWrapper(self.raw, encoding=self.encoding, newline='')
+        if is_csv(self.path):
+            self.rows = self.iter_csv(text)
+        else:
+            self.rows = (line.strip() for line in text)
+
+    def iter_csv(self, text):
+        reader = csv.reader(text)
+        column = self.column or 0
+        if self.has_header:
+            next(reader, None)
+        for row in reader:
+            yield row[column].strip() if column < len(row) else ""
+
+    def close(self):
+        if self.raw:
+            self.raw.close()
+            self.raw = None
+        self.done = True
+
+    @property
+    def progress(self):
+        if self.done:
+            return 1.0
+        if not self.raw:
+            return 0.0
+        return min(self.raw.tell() / self.total_bytes, 1.0)
+
+    @timed("导入分块")
+    def step(self):
+        if self.done:
+            return False
+        if self.rows is None:
+            self.open()
+
+        chunk = []
+        for name in self.rows:
+            self.lines += 1
+            if name:
+                chunk.append(name)
+            if len(chunk) >= self.chunk_size:
+                break
+        else:
+            self.close()
+
+        # 这里只做去重，名单在 record_import 时作为一次操作整体提交，撤销时也整体撤销
+        seen = self.seen
+        contains = self.engine.contains
+        for name in chunk:
+            if name in seen or contains(name):
+                self.duplicates += 1
+            else:
+                seen.add(name)
+                self.added.append(name)
+        return not self.done
+
+    def run(self):
+        try:
+            while self.step():
+                pass
+        finally:
+            self.close()
+        return self.added, self.duplicates
@@ -0,0 +1,121 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+MAX_SAMPLES = 1000
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyStats:
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        # 分位数只按最近的样本计算，长时间运行时内存占用固定
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+        self.samples.append(elapsed_ms)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'p50_ms': percentile(ordered, 0.5),
+            'p95_ms': percentile(ordered, 0.95),
+            'max_ms': self.max_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'last_ms': self.last_ms
+        }
+
+
+class Metrics:
+    def __init__(self, clock=time.perf_counter, max_samples=MAX_SAMPLES):
+        self.clock = clock
+        self.max_samples = max_samples
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def record(self, name, elapsed_ms):
+        # 保存和备份在后台线程中执行，记录时需要加锁
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = LatencyStats(self.max_samples)
+            stats.add(elapsed_ms)
+
+    def span(self, name):
+        return Span(self, name)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        with self.lock:
+            return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def to_dict(self, extra=None):
+        return {
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'since': self.started_at,
+            'operations': self.summary(),
+            **(extra or {})
+        }
+
+    def export_json(self, path, extra=None):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(extra), file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+
+class Span:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+        self.elapsed_ms = 0.0
+
+    def __enter__(self):
+        self.start = self.metrics.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (self.metrics.clock() - self.start) * 1000
+        self.metrics.record(self.name, self.elapsed_ms)
+        return False
+
+
+METRICS = Metrics()
+
+
+def timed(name):
+    return METRICS.timed(name)
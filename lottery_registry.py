@@ -0,0 +1,199 @@
+import time
+from array import array
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_MODE = "常规"
+
+
+def parse_timestamp(text):
+    if isinstance(text, int):
+        return text
+    try:
+        return int(datetime.strptime(text, TIMESTAMP_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_timestamp(epoch):
+    if not epoch:
+        return "未知"
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(epoch))
+
+
+class StudentRegistry:
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        student_id = self.ids.get(name)
+        if student_id is None:
+            student_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = student_id
+        return student_id
+
+    def intern_many(self, names):
+        return array('i', [self.intern(name) for name in names])
+
+    def id_of(self, name):
+        return self.ids.get(name)
+
+    def name(self, student_id):
+        return self.names[student_id]
+
+    def names_of(self, student_ids):
+        names = self.names
+        return [names[student_id] for student_id in student_ids]
+
+
+class HistoryLog:
+    def __init__(self, registry):
+        self.registry = registry
+        self.rounds = array('i')
+        self.timestamps = array('q')
+        self.modes = array('B')
+        self.offsets = array('I', [0])
+        self.members = array('i')
+        self.mode_names = []
+        self.mode_ids = {}
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def __bool__(self):
+        return bool(self.rounds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self.record(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def mode_id(self, mode):
+        mode_id = self.mode_ids.get(mode)
+        if mode_id is None:
+            mode_id = len(self.mode_names)
+            self.mode_names.append(mode)
+            self.mode_ids[mode] = mode_id
+        return mode_id
+
+    def append(self, round_num, member_ids, timestamp, mode=DEFAULT_MODE):
+        self.rounds.append(round_num)
+        self.timestamps.append(timestamp)
+        self.modes.append(self.mode_id(mode))
+        self.members.extend(member_ids)
+        self.offsets.append(len(self.members))
+        return len(self.rounds) - 1
+
+    def pop(self):
+        start = self.offsets[-2]
+        member_ids = self.members[start:]
+        del self.members[start:]
+        self.offsets.pop()
+        self.modes.pop()
+        self.timestamps.pop()
+        self.rounds.pop()
+        return member_ids
+
+    def member_ids(self, index):
+        return self.members[self.offsets[index]:self.offsets[index + 1]]
+
+    def round_at(self, index):
+        return self.rounds[index]
+
+    def mode_at(self, index):
+        return self.mode_names[self.modes[index]]
+
+    def timestamp_at(self, index):
+        return format_timestamp(self.timestamps[index])
+
+    def record(self, index):
+        # 只在界面显示和导出时才把编号还原成姓名
+        return {
+            'round': self.rounds[index],
+            'selected': self.registry.names_of(self.member_ids(index)),
+            'timestamp': self.timestamp_at(index),
+            'mode': self.mode_at(index)
+        }
+
+    def copy(self):
+        history = HistoryLog(self.registry)
+        history.rounds = array('i', self.rounds)
+        history.timestamps = array('q', self.timestamps)
+        history.modes = array('B', self.modes)
+        history.offsets = array('I', self.offsets)
+        history.members = array('i', self.members)
+        history.mode_names = list(self.mode_names)
+        history.mode_ids = dict(self.mode_ids)
+        return history
+
+    def to_dict(self):
+        offsets = self.offsets
+        return {
+            'rounds': self.rounds.tolist(),
+            'timestamps': self.timestamps.tolist(),
+            'mode_names': list(self.mode_names),
+            'modes': self.modes.tolist(),
+            'counts': [offsets[i + 1] - offsets[i] for i in range(len(self.rounds))],
+            'members': self.members.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, registry, data):
+        history = cls(registry)
+        history.mode_names = list(data.get('mode_names', []))
+        history.mode_ids = {mode: i for i, mode in enumerate(history.mode_names)}
+        history.rounds = array('i', data.get('rounds', []))
+        history.timestamps = array('q', data.get('timestamps', []))
+        history.modes = array('B', data.get('modes', []))
+        history.members = array('i', data.get('members', []))
+        offsets = array('I', [0])
+        total = 0
+        for count in data.get('counts', []):
+            total += count
+            offsets.append(total)
+        history.offsets = offsets
+        return history
+
+    @classmethod
+    def from_records(cls, registry, records):
+        history = cls(registry)
+        for record in records:
+            history.append(record['round'], registry.intern_many(record['selected']),
+                           parse_timestamp(record.get('timestamp')), record.get('mode', DEFAULT_MODE))
+        return history
+
+
+def is_compact_state(data):
+    return 'students' in data and isinstance(data.get('history'), dict)
+
+
+def expand_state(data):
+    # 把按编号存储的状态还原成按姓名存储的旧格式，供数据库等外部存储使用
+    if not is_compact_state(data):
+        return data
+
+    registry = StudentRegistry(data['students'])
+    history = HistoryLog.from_dict(registry, data['history'])
+    expanded = {key: value for key, value in data.items() if key != 'students'}
+    expanded['unselected'] = registry.names_of(data.get('unselected', []))
+    expanded['selected'] = registry.names_of(data.get('selected', []))
+    expanded['history'] = list(history)
+    expanded['import_history'] = [
+        {**record, 'students': registry.names_of(record['students']),
+         'timestamp': format_timestamp(record['timestamp'])}
+        for record in data.get('import_history', [])
+    ]
+    return expanded
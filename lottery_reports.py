@@ -0,0 +1,210 @@
+import csv
+import os
+import threading
+from datetime import datetime
+
+REPORT_PREVIEW_ROWS = 200
+
+
+def is_csv_path(path):
+    return path.lower().endswith(".csv")
+
+
+class BackgroundJob:
+    def __init__(self, target, total=0):
+        self.target = target
+        self.total = total
+        self.completed = 0
+        self.result = None
+        self.error = None
+        self.done = False
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="lottery-report", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 1.0 if self.done else 0.0
+        return min(self.completed / self.total, 1.0)
+
+    def run(self):
+        try:
+            self.result = self.target(self)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+
+def stream_to_file(job, path, lines=None, rows=None):
+    # 先写临时文件，取消或出错时不会留下只写了一半的导出结果
+    temp_path = f"{path}.tmp"
+    try:
+        if rows is not None:
+            with open(temp_path, 'w', encoding='utf-8-sig', newline='') as file:
+                writer = csv.writer(file)
+                for row in rows:
+                    if job.cancelled:
+                        break
+                    writer.writerow(row)
+                    job.completed += 1
+        else:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for line in lines:
+                    if job.cancelled:
+                        break
+                    file.write(line + "\n")
+                    job.completed += 1
+
+        if job.cancelled:
+            os.remove(temp_path)
+            return None
+        os.replace(temp_path, path)
+        return path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ReportData:
+    def __init__(self, engine):
+        # 在界面线程中复制名单和历史，排序和格式化都留给后台线程；历史按列存放在 array 中，
+        # 复制只是几段连续内存，10 万轮约 0.1 毫秒。姓名表只追加不修改，直接引用
+        self.generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.rounds = engine.current_round - 1
+        self.selected = engine.selected_students.as_list()
+        self.unselected = engine.last_round_unselected.as_list()
+        self.history = engine.lottery_history.copy()
+        self.selection_count = engine.selection_count[:]
+        self.names = engine.registry.names
+
+    @property
+    def total(self):
+        return len(self.selected) + len(self.unselected)
+
+    def summary_lines(self):
+        return [
+            "抽签系统统计报告",
+            "=" * 40,
+            f"生成时间: {self.generated_at}",
+            f"总抽签轮次: {self.rounds}",
+            f"总人数: {self.total}",
+            f"已抽中人数: {len(self.selected)}",
+            f"未抽中人数: {len(self.unselected)}",
+            ""
+        ]
+
+    def frequency(self):
+        names = self.names
+        counts = [(names[student_id], count) for student_id, count in enumerate(self.selection_count) if count]
+        return sorted(counts, key=lambda x: x[1], reverse=True)
+
+    def report_lines(self, frequency):
+        yield from self.summary_lines()
+        yield "抽签频率统计:"
+        yield "-" * 20
+        for student, count in frequency:
+            yield f"{student}: {count}次"
+
+    def report_rows(self, frequency):
+        yield ["生成时间", self.generated_at]
+        yield ["总抽签轮次", self.rounds]
+        yield ["总人数", self.total]
+        yield ["已抽中人数", len(self.selected)]
+        yield ["未抽中人数", len(self.unselected)]
+        yield []
+        yield ["学生", "抽中次数"]
+        for student, count in frequency:
+            yield [student, count]
+
+    def report_size(self, csv_format):
+        counts = self.selection_count
+        return len(counts) - counts.count(0) + (7 if csv_format else 10)
+
+    def results_lines(self):
+        yield "抽签结果报告"
+        yield "=" * 40
+        yield f"生成时间: {self.generated_at}"
+        yield f"总抽签轮次: {self.rounds}"
+        yield f"已抽中总人数: {len(self.selected)}"
+        yield f"剩余未抽中人数: {len(self.unselected)}"
+        yield ""
+        yield "已抽中学生名单:"
+        yield "-" * 20
+        for i, student in enumerate(self.selected, 1):
+            yield f"{i}. {student}"
+        yield ""
+        yield "抽签历史:"
+        yield "-" * 20
+        for record in self.history:
+            yield f"第{record['round']}轮 ({record['timestamp']}) [{record.get('mode', '常规')}]: {', '.join(record['selected'])}"
+
+    def results_rows(self):
+        yield ["轮次", "时间", "模式", "学生"]
+        for record in self.history:
+            for student in record['selected']:
+                yield [record['round'], record['timestamp'], record.get('mode', '常规'), student]
+
+    def results_size(self, csv_format):
+        if csv_format:
+            return len(self.history.members) + 1
+        return len(self.selected) + len(self.history) + 12
+
+    def unselected_lines(self):
+        yield "未抽中学生名单"
+        yield "=" * 20
+        yield f"生成时间: {self.generated_at}"
+        yield f"总人数: {len(self.unselected)}"
+        yield ""
+        yield from self.unselected
+
+    def unselected_rows(self):
+        yield ["学生"]
+        for student in self.unselected:
+            yield [student]
+
+
+def export_report_job(data, path, frequency=None):
+    csv_format = is_csv_path(path)
+
+    def run(job):
+        items = frequency if frequency is not None else data.frequency()
+        if csv_format:
+            return stream_to_file(job, path, rows=data.report_rows(items))
+        return stream_to_file(job, path, lines=data.report_lines(items))
+
+    return BackgroundJob(run, data.report_size(csv_format))
+
+
+def export_results_job(data, path):
+    csv_format = is_csv_path(path)
+
+    def run(job):
+        if csv_format:
+            return stream_to_file(job, path, rows=data.results_rows())
+        return stream_to_file(job, path, lines=data.results_lines())
+
+    return BackgroundJob(run, data.results_size(csv_format))
+
+
+def export_unselected_job(data, path):
+    csv_format = is_csv_path(path)
+
+    def run(job):
+        if csv_format:
+            return stream_to_file(job, path, rows=data.unselected_rows())
+        return stream_to_file(job, path, lines=data.unselected_lines())
+
+    return BackgroundJob(run, len(data.unselected) + (1 if csv_format else 5))
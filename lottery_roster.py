@@ -0,0 +1,109 @@
+import random
+
+
+class OrderedRoster:
+    def __init__(self, students=()):
+        self._positions = {}
+        self._next_position = 0
+        self._list_cache = None
+        self.version = 0
+        self.extend(students)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __bool__(self):
+        return bool(self._positions)
+
+    def __contains__(self, student_name):
+        return student_name in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __getitem__(self, index):
+        return self.as_list()[index]
+
+    def __repr__(self):
+        return f"OrderedRoster({self.as_list()!r})"
+
+    def as_list(self):
+        if self._list_cache is None:
+            self._list_cache = list(self._positions)
+        return self._list_cache
+
+    def position_key(self, student_name):
+        return self._positions[student_name]
+
+    def index_of(self, student_name):
+        # 列表始终按位置键递增排列，二分查找即可得到下标
+        positions = self._positions
+        key = positions[student_name]
+        students = self.as_list()
+        low, high = 0, len(students)
+        while low < high:
+            middle = (low + high) // 2
+            if positions[students[middle]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _changed(self):
+        self._list_cache = None
+        self.version += 1
+
+    def add(self, student_name):
+        if student_name in self._positions:
+            return False
+        self._positions[student_name] = self._next_position
+        self._next_position += 1
+        self._changed()
+        return True
+
+    def extend(self, students):
+        added = []
+        positions = self._positions
+        for student_name in students:
+            if student_name not in positions:
+                positions[student_name] = self._next_position
+                self._next_position += 1
+                added.append(student_name)
+        if added:
+            self._changed()
+        return added
+
+    def discard(self, student_name):
+        if self._positions.pop(student_name, None) is None:
+            return False
+        self._changed()
+        return True
+
+    def remove_many(self, students):
+        removed = []
+        positions = self._positions
+        for student_name in students:
+            if positions.pop(student_name, None) is not None:
+                removed.append(student_name)
+        if removed:
+            self._changed()
+        return removed
+
+    def move_to(self, other, students):
+        moved = self.remove_many(students)
+        other.extend(moved)
+        return moved
+
+    def replace(self, students):
+        self._positions = {}
+        self._next_position = 0
+        self.extend(students)
+        self._changed()
+
+    def clear(self):
+        self.replace(())
+
+    def shuffle(self, rng=random):
+        students = list(self._positions)
+        rng.shuffle(students)
+        self.replace(students)
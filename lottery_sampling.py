@@ -0,0 +1,84 @@
+import random
+
+
+class FenwickSampler:
+    def __init__(self, weights):
+        self.weights = [w if w > 0 else 0 for w in weights]
+        self.size = len(self.weights)
+        self.tree = [0] * (self.size + 1)
+
+        for i in range(1, self.size + 1):
+            self.tree[i] += self.weights[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+        self.total = self.prefix_sum(self.size)
+        self.top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def prefix_sum(self, count):
+        result = 0
+        while count > 0:
+            result += self.tree[count]
+            count -= count & -count
+        return result
+
+    def update(self, index, weight):
+        weight = weight if weight > 0 else 0
+        delta = weight - self.weights[index]
+        if not delta:
+            return
+
+        self.weights[index] = weight
+        self.total += delta
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        pos = 0
+        step = self.top_bit
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    def pick_index(self, rng=random):
+        if self.total <= 0:
+            return None
+
+        index = self.find(rng.random() * self.total)
+        if index >= self.size:
+            # 浮点累计误差导致目标值越界时，按精确总和重新抽取
+            self.total = self.prefix_sum(self.size)
+            if self.total <= 0:
+                return None
+            index = min(self.find(rng.random() * self.total), self.size - 1)
+        return index
+
+    def sample(self, num_to_select, rng=random, restore=False):
+        indices = []
+        removed = []
+        for _ in range(num_to_select):
+            index = self.pick_index(rng)
+            if index is None:
+                break
+
+            indices.append(index)
+            removed.append(self.weights[index])
+            self.update(index, 0)
+
+        if restore:
+            # 抽完后恢复被置零的权重，缓存的累计树可以留给下一次使用
+            for index, weight in zip(indices, removed):
+                self.update(index, weight)
+        return indices
+
+
+def weighted_sample(items, weights, num_to_select, rng=random):
+    sampler = FenwickSampler(weights)
+    return [items[index] for index in sampler.sample(num_to_select, rng)]
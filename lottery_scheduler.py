@@ -0,0 +1,89 @@
+import random
+import time
+
+FRAME_BUDGETS_MS = {"慢速": 200, "中速": 100, "快速": 50}
+DEFAULT_FRAME_MS = 100
+ANIMATION_FRAMES = 20
+ANIMATION_DISPLAY_SIZE = 5
+
+
+def animation_frames(students, frame_count=ANIMATION_FRAMES, display_size=ANIMATION_DISPLAY_SIZE, rng=random):
+    # 每帧只抽取需要显示的几个名字，开销与名单长度无关
+    size = min(display_size, len(students))
+    for _ in range(frame_count):
+        yield rng.sample(students, size)
+
+
+class FrameScheduler:
+    def __init__(self, widget, frame_ms, frame_count, on_frame, on_done, clock=time.perf_counter):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self.frame_count = frame_count
+        self.on_frame = on_frame
+        self.on_done = on_done
+        self.clock = clock
+        self.after_id = None
+        self.running = False
+        self.frame = 0
+        self.started = None
+        self.last_tick = None
+        self.intervals = []
+        self.frame_costs = []
+        self.dropped_frames = 0
+
+    def start(self):
+        self.running = True
+        self.started = self.clock()
+        self.schedule(0)
+        return self
+
+    def schedule(self, delay_ms):
+        self.after_id = self.widget.after(max(0, int(delay_ms)), self.tick)
+
+    def tick(self):
+        self.after_id = None
+        if not self.running:
+            return
+
+        now = self.clock()
+        if self.last_tick is not None:
+            self.intervals.append((now - self.last_tick) * 1000)
+        self.last_tick = now
+
+        # 事件循环被阻塞而落后时直接跳过过期的帧，保证整段动画的时长固定
+        due = int((now - self.started) * 1000 // self.frame_ms)
+        if due > self.frame:
+            self.dropped_frames += due - self.frame
+            self.frame = due
+
+        if self.frame >= self.frame_count:
+            self.running = False
+            self.on_done()
+            return
+
+        self.on_frame(self.frame)
+        self.frame_costs.append((self.clock() - now) * 1000)
+        self.frame += 1
+
+        next_due = self.started + self.frame * self.frame_ms / 1000
+        self.schedule((next_due - self.clock()) * 1000)
+
+    def cancel(self):
+        self.running = False
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def metrics(self):
+        intervals = self.intervals or [0]
+        costs = self.frame_costs or [0]
+        return {
+            'frame_ms': self.frame_ms,
+            'rendered_frames': len(self.frame_costs),
+            'dropped_frames': self.dropped_frames,
+            'late_frames': sum(1 for cost in self.frame_costs if cost > self.frame_ms),
+            'mean_frame_cost_ms': sum(costs) / len(costs),
+            'max_frame_cost_ms': max(costs),
+            'max_interval_ms': max(intervals),
+            'max_jitter_ms': max(abs(interval - self.frame_ms) for interval in intervals) if self.intervals else 0
+        }
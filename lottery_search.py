@@ -0,0 +1,89 @@
+SEARCH_RESULT_LIMIT = 1000
+SEARCH_DEBOUNCE_MS = 150
+
+
+class SearchIndex:
+    def __init__(self, students=()):
+        self.lowered = {}
+        self.postings = {}
+        self.version = 0
+        self.add(students)
+
+    @staticmethod
+    def grams(text):
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def add(self, students):
+        lowered = self.lowered
+        postings = self.postings
+        added = False
+
+        for student in students:
+            if student in lowered:
+                continue
+            text = student.lower()
+            lowered[student] = text
+            for gram in self.grams(text):
+                postings.setdefault(gram, set()).add(student)
+            added = True
+
+        if added:
+            self.version += 1
+
+    def rebuild(self, students=()):
+        self.lowered = {}
+        self.postings = {}
+        self.add(students)
+        self.version += 1
+
+    def candidates(self, query):
+        if len(query) == 1:
+            return self.postings.get(query, set())
+
+        posting_sets = []
+        for i in range(len(query) - 1):
+            posting = self.postings.get(query[i:i + 2])
+            if not posting:
+                return set()
+            posting_sets.append(posting)
+
+        posting_sets.sort(key=len)
+        return posting_sets[0].intersection(*posting_sets[1:])
+
+    def search(self, query, pool):
+        lowered = self.lowered
+        matches = [s for s in self.candidates(query) if s in pool and query in lowered[s]]
+        matches.sort(key=pool.position_key)
+        return matches
+
+
+class SearchSession:
+    def __init__(self, index, limit=SEARCH_RESULT_LIMIT):
+        self.index = index
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.last_query = ""
+        self.last_key = None
+        self.last_matches = []
+
+    def search(self, query, pool):
+        query = query.lower()
+        if not query:
+            self.reset()
+            return [], 0
+
+        key = (id(pool), pool.version, self.index.version)
+        if self.last_query and self.last_query in query and self.last_key == key:
+            lowered = self.index.lowered
+            matches = [s for s in self.last_matches if query in lowered[s]]
+        else:
+            matches = self.index.search(query, pool)
+
+        self.last_query = query
+        self.last_key = key
+        self.last_matches = matches
+        return matches[:self.limit], len(matches)
@@ -0,0 +1,287 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from lottery_metrics import timed
+from lottery_registry import expand_state
+from lottery_storage import COMPRESSION_NONE, JournalStore, StateGuard, STATE_FILE
+
+STATE_DB = "lottery.db"
+POOLS = ("selected", "unselected")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    pool TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (pool, name)
+);
+CREATE INDEX IF NOT EXISTS idx_students_position ON students (pool, position);
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    round INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    mode TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS round_members (
+    round_id INTEGER NOT NULL REFERENCES rounds (id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (round_id, position)
+);
+CREATE TABLE IF NOT EXISTS weights (
+    name TEXT PRIMARY KEY,
+    weight NUMERIC NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    students TEXT NOT NULL
+);
+"""
+
+
+class SqliteStore:
+    def __init__(self, db_file=STATE_DB, legacy_file=STATE_FILE, writer=None, compression=COMPRESSION_NONE,
+                 state_lock=None):
+        self.db_file = db_file
+        self.legacy_file = legacy_file
+        self.writer = writer
+        self.compression = compression
+        self.migrating = False
+        self.next_position = {pool: 0 for pool in POOLS}
+        self.lock = threading.Lock()
+        # 写入都在后台写线程中执行，读取只在启动时进行，由 lock 串行化
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.guard = StateGuard(self.revision, state_lock)
+
+    def run(self, job, key=None):
+        if self.writer:
+            self.writer.submit(lambda: self.guard.run(job), key)
+        else:
+            self.guard.run(job)
+
+    def revision(self):
+        # 其他连接提交事务后 data_version 才会变化，本连接自己的写入不影响它
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_externally(self):
+        return self.guard.changed()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                          (key, json.dumps(value, ensure_ascii=False)))
+
+    def load(self):
+        return self.guard.load(self.read_or_migrate)
+
+    def read_or_migrate(self):
+        with self.lock:
+            if self.get_meta('initialized'):
+                return self.read_state(), []
+
+        legacy = JournalStore(self.legacy_file)
+        if not os.path.exists(legacy.state_file) and not os.path.exists(legacy.journal_file):
+            with self.lock, self.conn:
+                self.set_meta('initialized', True)
+            return None, []
+
+        # 首次启用数据库时从原 JSON 存档迁移，调用方回放日志后写入完整快照
+        data, ops = legacy.load()
+        self.migrating = True
+        return data, ops
+
+    def read_state(self):
+        conn = self.conn
+        data = {}
+        for pool in POOLS:
+            data[pool] = [row[0] for row in conn.execute(
+                "SELECT name FROM students WHERE pool = ? ORDER BY position", (pool,))]
+            self.next_position[pool] = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM students WHERE pool = ?", (pool,)).fetchone()[0]
+
+        history = []
+        records = {}
+        for round_id, round_num, timestamp, mode in conn.execute(
+                "SELECT id, round, timestamp, mode FROM rounds ORDER BY id"):
+            record = {'round': round_num, 'selected': [], 'timestamp': timestamp, 'mode': mode}
+            records[round_id] = record
+            history.append(record)
+        for round_id, name in conn.execute("SELECT round_id, name FROM round_members ORDER BY round_id, position"):
+            records[round_id]['selected'].append(name)
+
+        data['history'] = history
+        data['weights'] = {name: weight for name, weight in conn.execute("SELECT name, weight FROM weights")}
+        data['import_history'] = [
+            {'name': name, 'path': path, 'students': json.loads(students), 'timestamp': timestamp}
+            for name, path, timestamp, students in conn.execute(
+                "SELECT name, path, timestamp, students FROM imports ORDER BY id")
+        ]
+        data['round'] = self.get_meta('round', 1)
+        data['settings'] = self.get_meta('settings', {})
+        data['last_updated'] = self.get_meta('last_updated', '未知')
+        return data
+
+    def append(self, op):
+        op = dict(op)
+        self.run(lambda: self.write_op(op))
+
+    @timed("写入日志")
+    def write_op(self, op):
+        with self.lock, self.conn:
+            getattr(self, "_write_" + op["op"])(op)
+            self.set_meta('last_updated', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def insert_students(self, pool, students):
+        position = self.next_position[pool]
+        rows = []
+        for student in students:
+            rows.append((pool, student, position))
+            position += 1
+        self.conn.executemany("INSERT OR IGNORE INTO students (pool, name, position) VALUES (?, ?, ?)", rows)
+        self.next_position[pool] = position
+
+    def delete_students(self, pool, students):
+        cursor = self.conn.cursor()
+        removed = []
+        for student in students:
+            cursor.execute("DELETE FROM students WHERE pool = ? AND name = ?", (pool, student))
+            if cursor.rowcount:
+                removed.append(student)
+        return removed
+
+    def move_students(self, source, target, students):
+        self.insert_students(target, self.delete_students(source, students))
+
+    def insert_round(self, record):
+        cursor = self.conn.execute("INSERT INTO rounds (round, timestamp, mode) VALUES (?, ?, ?)",
+                                   (record['round'], record.get('timestamp', ''), record.get('mode', '常规')))
+        self.conn.executemany("INSERT INTO round_members (round_id, position, name) VALUES (?, ?, ?)",
+                              [(cursor.lastrowid, i, name) for i, name in enumerate(record['selected'])])
+
+    def insert_import(self, record):
+        self.conn.execute("INSERT INTO imports (name, path, timestamp, students) VALUES (?, ?, ?, ?)",
+                          (record['name'], record['path'], record['timestamp'],
+                           json.dumps(record['students'], ensure_ascii=False)))
+
+    def _write_draw(self, op):
+        self.move_students("unselected", "selected", op["selected"])
+        self.insert_round(op)
+        self.set_meta('round', op["round"] + 1)
+
+    def _write_skip(self, op):
+        self.set_meta('round', self.get_meta('round', 1) + 1)
+
+    def _write_move(self, op):
+        source = "unselected" if op["to"] == "selected" else "selected"
+        self.move_students(source, op["to"], op["students"])
+
+    def _write_add(self, op):
+        self.insert_students("unselected", op["students"])
+
+    def _write_remove(self, op):
+        self.delete_students(op["pool"], op["students"])
+
+    def _write_import(self, op):
+        if op.get("add"):
+            self.insert_students("unselected", op["students"])
+        self.insert_import(op)
+
+    def _write_replace_unselected(self, op):
+        self.conn.execute("DELETE FROM students WHERE pool = 'unselected'")
+        self.next_position["unselected"] = 0
+        self.insert_students("unselected", op["students"])
+
+    def _write_replace_pool(self, op):
+        self.conn.execute("DELETE FROM students WHERE pool = ?", (op["pool"],))
+        self.next_position[op["pool"]] = 0
+        self.insert_students(op["pool"], op["students"])
+
+    def _write_batch(self, op):
+        for child in op["ops"]:
+            getattr(self, "_write_" + child["op"])(child)
+
+    def _write_pop_history(self, op):
+        row = self.conn.execute("SELECT MAX(id) FROM rounds").fetchone()
+        if row[0] is not None:
+            self.conn.execute("DELETE FROM round_members WHERE round_id = ?", row)
+            self.conn.execute("DELETE FROM rounds WHERE id = ?", row)
+
+    def _write_set_round(self, op):
+        self.set_meta('round', op["round"])
+
+    def _write_pop_import(self, op):
+        self.conn.execute("DELETE FROM imports WHERE id = (SELECT MAX(id) FROM imports)")
+
+    def _write_unset_weights(self, op):
+        self.conn.executemany("DELETE FROM weights WHERE name = ?", [(student,) for student in op["students"]])
+
+    def _write_load(self, op):
+        self.write_state(expand_state(op["state"]))
+
+    def _write_weights(self, op):
+        self.conn.executemany("INSERT OR REPLACE INTO weights (name, weight) VALUES (?, ?)",
+                              list(op["weights"].items()))
+
+    def _write_reset_weights(self, op):
+        self.conn.execute("DELETE FROM weights")
+
+    def _write_reset(self, op):
+        self.conn.execute("DELETE FROM students")
+        self.conn.execute("DELETE FROM round_members")
+        self.conn.execute("DELETE FROM rounds")
+        self.next_position = {pool: 0 for pool in POOLS}
+        self.set_meta('round', 1)
+        if op.get("clear_weights"):
+            self.conn.execute("DELETE FROM weights")
+
+    def needs_compaction(self):
+        return self.migrating
+
+    def needs_flush(self):
+        # 每个操作都已在自己的事务中写入，只有尚未完成的迁移需要补写快照
+        return self.migrating
+
+    def write_snapshot(self, data):
+        data = dict(data)
+        self.migrating = False
+        self.run(lambda: self.commit_snapshot(data), key=("snapshot", self.db_file))
+
+    @timed("保存快照")
+    def commit_snapshot(self, data):
+        with self.lock, self.conn:
+            self.write_state(expand_state(data))
+            self.set_meta('settings', data.get('settings', {}))
+            self.set_meta('last_updated', data.get('last_updated', '未知'))
+            self.set_meta('initialized', True)
+
+    def write_state(self, data):
+        conn = self.conn
+        for table in ("students", "round_members", "rounds", "weights", "imports"):
+            conn.execute(f"DELETE FROM {table}")
+        self.next_position = {pool: 0 for pool in POOLS}
+        for pool in POOLS:
+            self.insert_students(pool, data.get(pool, []))
+        for record in data.get('history', []):
+            self.insert_round(record)
+        conn.executemany("INSERT INTO weights (name, weight) VALUES (?, ?)",
+                         list(data.get('weights', {}).items()))
+        for record in data.get('import_history', []):
+            self.insert_import(record)
+        self.set_meta('round', data.get('round', 1))
@@ -0,0 +1,383 @@
+import gzip
+import io
+import json
+import lzma
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from lottery_metrics import timed
+
+STATE_FILE = "unselected_students.json"
+LOCK_FILE = "lottery.lock"
+LOCK_WAIT_SECONDS = 5
+JOURNAL_SUFFIX = ".journal"
+COMPACT_THRESHOLD = 200
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_LZMA = "lzma"
+COMPRESSION_CHOICES = (COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_LZMA)
+GZIP_MAGIC = b"\x1f\x8b"
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+
+def detect_compression(head):
+    if head.startswith(GZIP_MAGIC):
+        return COMPRESSION_GZIP
+    if head.startswith(LZMA_MAGIC):
+        return COMPRESSION_LZMA
+    return COMPRESSION_NONE
+
+
+def compressed_stream(raw, compression, mode='rb'):
+    if compression == COMPRESSION_GZIP:
+        # mtime 固定为 0，相同内容压缩后的字节也相同
+        return gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=6, mtime=0)
+    if compression == COMPRESSION_LZMA:
+        return lzma.LZMAFile(raw, mode)
+    return raw
+
+
+def compress_bytes(data, compression):
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == COMPRESSION_LZMA:
+        return lzma.compress(data)
+    return data
+
+
+def decompress_bytes(data):
+    compression = detect_compression(data[:len(LZMA_MAGIC)])
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression == COMPRESSION_LZMA:
+        return lzma.decompress(data)
+    return data
+
+
+def encode_json(data, compression=COMPRESSION_NONE, indent=2):
+    if compression == COMPRESSION_NONE:
+        text = json.dumps(data, ensure_ascii=False, indent=indent)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return compress_bytes(text.encode('utf-8'), compression)
+
+
+def read_json(path):
+    with open(path, 'rb') as raw:
+        compression = detect_compression(raw.read(len(LZMA_MAGIC)))
+        raw.seek(0)
+        stream = compressed_stream(raw, compression)
+        file = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            return json.load(file)
+        finally:
+            file.detach()
+
+
+def write_bytes_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def write_json_atomic(path, data, indent=2, compression=COMPRESSION_NONE):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as raw:
+        stream = compressed_stream(raw, compression, 'wb')
+        file = io.TextIOWrapper(stream, encoding='utf-8')
+        # json.dump 按片段写入，压缩流边编码边输出，不在内存中拼出整个文本
+        if compression == COMPRESSION_NONE:
+            json.dump(data, file, ensure_ascii=False, indent=indent)
+        else:
+            json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+        file.flush()
+        file.detach()
+        if stream is not raw:
+            stream.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(temp_path, path)
+
+
+def lock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class StateLock:
+    # 图形界面和命令行模式读写同一份存档和日志，同一时间只允许一个进程持有
+    # 锁由操作系统在进程退出时自动释放，程序崩溃后不会留下失效的锁
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self.file = None
+
+    def acquire(self, timeout=0):
+        deadline = time.monotonic() + timeout
+        file = open(self.path, 'a+b')
+        while True:
+            try:
+                lock_file(file)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    file.close()
+                    return False
+                time.sleep(0.1)
+        self.file = file
+        return True
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            unlock_file(self.file)
+        finally:
+            self.file.close()
+            self.file = None
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class StateGuard:
+    # 图形界面只在写入和重新加载时短暂持有存档锁，窗口打开时命令行模式照样可以运行；
+    # 写入前先确认存档仍是本进程上次看到的版本，被其他进程改过就不再写入，等界面重新加载
+    def __init__(self, revision, state_lock=None, timeout=LOCK_WAIT_SECONDS):
+        self.revision = revision
+        self.state_lock = state_lock
+        self.timeout = timeout
+        self.known = revision()
+        self.conflict = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        return self.state_lock is None or self.state_lock.acquire(timeout=self.timeout)
+
+    def release(self):
+        if self.state_lock is not None:
+            self.state_lock.release()
+
+    def load(self, loader):
+        with self.lock:
+            if not self.acquire():
+                self.conflict = True
+                raise RuntimeError("存档正在被其他抽签程序使用")
+            try:
+                result = loader()
+                self.known = self.revision()
+                self.conflict = False
+                return result
+            finally:
+                self.release()
+
+    def run(self, job):
+        with self.lock:
+            if self.conflict:
+                return None
+            if not self.acquire():
+                print("写入存档时出错: 等待存档锁超时")
+                self.conflict = True
+                return None
+            try:
+                if self.revision() != self.known:
+                    print("写入存档时出错: 存档已被其他程序修改，等待重新加载")
+                    self.conflict = True
+                    return None
+                result = job()
+                self.known = self.revision()
+                return result
+            finally:
+                self.release()
+
+    def changed(self):
+        # 写入线程正在写时不等待，下次检查再说
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            return self.conflict or self.revision() != self.known
+        finally:
+            self.lock.release()
+
+
+class BackgroundWriter:
+    def __init__(self):
+        self.jobs = {}
+        self.order = deque()
+        self.active = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="lottery-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, job, key=None):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("写入线程已关闭")
+            if key is None:
+                key = object()
+            if key not in self.jobs:
+                self.order.append(key)
+            self.jobs[key] = job
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.order and not self.closed:
+                    self.condition.wait()
+                if not self.order:
+                    return
+                key = self.order.popleft()
+                job = self.jobs.pop(key)
+                self.active += 1
+
+            try:
+                job()
+            except Exception as e:
+                print(f"后台写入时出错: {str(e)}")
+            finally:
+                with self.condition:
+                    self.active -= 1
+                    self.condition.notify_all()
+
+    def pending(self):
+        with self.condition:
+            return bool(self.order) or self.active > 0
+
+    def close(self, timeout=None):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+
+class JournalStore:
+    def __init__(self, state_file=STATE_FILE, compact_threshold=COMPACT_THRESHOLD, writer=None,
+                 compression=COMPRESSION_NONE, state_lock=None):
+        self.state_file = state_file
+        self.journal_file = state_file + JOURNAL_SUFFIX
+        self.compact_threshold = compact_threshold
+        self.writer = writer
+        self.compression = compression
+        self.seq = 0
+        self.pending_ops = 0
+        self.lock = threading.Lock()
+        self.guard = StateGuard(self.revision, state_lock)
+
+    def run(self, job, key=None):
+        if self.writer:
+            self.writer.submit(lambda: self.guard.run(job), key)
+        else:
+            self.guard.run(job)
+
+    def revision(self):
+        return file_signature(self.state_file), file_signature(self.journal_file)
+
+    def changed_externally(self):
+        return self.guard.changed()
+
+    def load(self):
+        return self.guard.load(self.read_files)
+
+    def read_files(self):
+        data = None
+        if os.path.exists(self.state_file):
+            data = read_json(self.state_file)
+
+        snapshot_seq = data.get('journal_seq', 0) if data else 0
+        journal_ops, intact = self.read_journal()
+        ops = [op for op in journal_ops if op.get('seq', 0) > snapshot_seq]
+        if not intact:
+            self.rewrite_journal(ops)
+
+        self.seq = max([snapshot_seq] + [op['seq'] for op in ops])
+        self.pending_ops = len(ops)
+        return data, ops
+
+    def read_journal(self):
+        if not os.path.exists(self.journal_file):
+            return [], True
+
+        ops = []
+        with open(self.journal_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    # 上次异常退出时可能留下半行记录，之后的内容不再可信
+                    return ops, False
+        return ops, True
+
+    def rewrite_journal(self, ops):
+        temp_path = f"{self.journal_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for op in ops:
+                file.write(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + "\n")
+        os.replace(temp_path, self.journal_file)
+
+    def append(self, op):
+        with self.lock:
+            self.seq += 1
+            self.pending_ops += 1
+            line = json.dumps({**op, 'seq': self.seq}, ensure_ascii=False, separators=(',', ':'))
+        self.run(lambda: self.write_line(line))
+
+    @timed("写入日志")
+    def write_line(self, line):
+        with open(self.journal_file, 'a', encoding='utf-8') as file:
+            file.write(line + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def needs_compaction(self):
+        return self.pending_ops >= self.compact_threshold
+
+    def needs_flush(self):
+        # 日志中还有未合并进快照的操作，关闭前写一次快照，下次启动不必重放
+        return self.pending_ops > 0
+
+    def write_snapshot(self, data):
+        # 快照在提交时就确定了 journal_seq；排在它之前的日志行都已包含在快照中，
+        # 所以合并后的快照在执行时截断日志是安全的
+        with self.lock:
+            data = {**data, 'journal_seq': self.seq}
+            self.pending_ops = 0
+        compression = self.compression
+        self.run(lambda: self.commit_snapshot(data, compression), key=("snapshot", self.state_file))
+
+    @timed("保存快照")
+    def commit_snapshot(self, data, compression=COMPRESSION_NONE):
+        write_json_atomic(self.state_file, data, compression=compression)
+        with open(self.journal_file, 'w', encoding='utf-8'):
+            pass
@@ -0,0 +1,71 @@
+from lottery_sampling import FenwickSampler
+
+DEFAULT_WEIGHT = 5
+
+
+class WeightTable:
+    def __init__(self, registry, weights=None):
+        self.registry = registry
+        self.weights = {}
+        self.values = []
+        self.version = 0
+        self.cache_key = None
+        self.sampler = None
+        self.items = None
+        self.positions = None
+        if weights:
+            self.update(weights)
+
+    def get(self, student_name):
+        # 按学生编号直接取权重，界面渲染时不需要额外缓存
+        student_id = self.registry.ids.get(student_name)
+        if student_id is None or student_id >= len(self.values):
+            return DEFAULT_WEIGHT
+        return self.values[student_id]
+
+    def _set_value(self, student_name, weight):
+        student_id = self.registry.intern(student_name)
+        missing = student_id + 1 - len(self.values)
+        if missing > 0:
+            self.values.extend([DEFAULT_WEIGHT] * missing)
+        self.values[student_id] = weight
+
+    def update(self, weights):
+        for student_name, weight in weights.items():
+            self.weights[student_name] = weight
+            self._set_value(student_name, weight)
+        self.version += 1
+
+    def unset(self, students):
+        for student_name in students:
+            if self.weights.pop(student_name, None) is not None:
+                self._set_value(student_name, DEFAULT_WEIGHT)
+        self.version += 1
+
+    def reset(self):
+        # 旧的权重字典会被撤销记录引用，这里换成新字典而不是原地清空
+        self.weights = {}
+        self.values = []
+        self.version += 1
+
+    def sampler_for(self, roster):
+        # 权重和名单都没有变化时复用同一棵累计权重树
+        key = (self.version, id(roster), roster.version)
+        if self.cache_key != key:
+            self.items = roster.as_list()
+            self.sampler = FenwickSampler([self.get(student) for student in self.items])
+            self.positions = None
+            self.cache_key = key
+        return self.sampler, self.items
+
+    def advance(self, roster, version_before, removed):
+        # 抽签只是把抽中的学生移出名单，把对应权重置零即可继续使用缓存
+        if self.cache_key != (self.version, id(roster), version_before):
+            return
+        if self.positions is None:
+            self.positions = {student: i for i, student in enumerate(self.items)}
+        for student in removed:
+            index = self.positions.get(student)
+            if index is not None:
+                self.sampler.update(index, 0)
+        self.cache_key = (self.version, id(roster), roster.version)
@@ -1,17 +1,44 @@
+import sys
+
+# 带参数启动时进入命令行模式，不加载 tkinter 也不创建窗口
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from lottery_cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
-import random
 import json
 import os
 from datetime import datetime
-import threading
 import time
-from functools import lru_cache
+
+from lottery_engine import (LotteryEngine, MODE_NORMAL, MODE_WEIGHTED, MODE_FAIR, MODE_QUICK, DEFAULT_WEIGHT,
+                            OP_LABELS)
+from lottery_search import SearchSession, SEARCH_DEBOUNCE_MS
+from lottery_storage import BackgroundWriter, JournalStore, StateLock, COMPRESSION_CHOICES, COMPRESSION_NONE
+from lottery_sqlite import SqliteStore
+from lottery_backup import BackupStore
+from lottery_history import HistoryPager, MODE_ALL
+from lottery_reports import (BackgroundJob, ReportData, REPORT_PREVIEW_ROWS, export_report_job, export_results_job,
+                             export_unselected_job)
+from lottery_scheduler import (FrameScheduler, FRAME_BUDGETS_MS, DEFAULT_FRAME_MS, ANIMATION_FRAMES,
+                               animation_frames)
+from lottery_metrics import METRICS
+from lottery_importer import RosterImporter, ENCODING_AUTO, ENCODING_CHOICES, detect_encoding, is_csv, read_header
 
 class CheckboxTreeview(ttk.Treeview):
-    def __init__(self, master=None, **kwargs):
+    def __init__(self, master=None, virtual=False, buffer_rows=5, **kwargs):
         if 'height' in kwargs:
             kwargs.pop('height')
+        self.virtual = virtual
+        self.buffer_rows = buffer_rows
+        self.row_keys = []
+        self.row_factory = None
+        self.first_row = 0
+        self.visible_rows = 20
+        self.virtual_yscrollcommand = None
+        self.rendered_rows = {}
+        self.rendered_order = []
         super().__init__(master, **kwargs)
         self.checked_items = set()
         self.bind('<Button-1>', self.on_click)
@@ -20,6 +47,12 @@ class CheckboxTreeview(ttk.Treeview):
             "checked": self.create_checkbox_image(True),
             "unchecked": self.create_checkbox_image(False)
         }
+        
+        if virtual:
+            self.bind('<Configure>', self.on_virtual_configure)
+            self.bind('<MouseWheel>', self.on_virtual_wheel)
+            self.bind('<Button-4>', lambda e: self.on_virtual_wheel(e, -1))
+            self.bind('<Button-5>', lambda e: self.on_virtual_wheel(e, 1))
     
     def create_checkbox_image(self, checked):
         image = tk.PhotoImage(width=16, height=16)
@@ -34,58 +67,183 @@ class CheckboxTreeview(ttk.Treeview):
         
         return image
     
+    def configure(self, cnf=None, **kw):
+        if self.virtual and 'yscrollcommand' in kw:
+            self.virtual_yscrollcommand = kw.pop('yscrollcommand')
+            self.update_scrollbar()
+            if not kw and not cnf:
+                return None
+        return super().configure(cnf, **kw)
+    
+    config = configure
+    
     def on_click(self, event):
         item = self.identify_row(event.y)
         column = self.identify_column(event.x)
         
+        # 行的 iid 就是学生姓名，不必再向 Tk 查询行文本
         if item and column == "#0":
-            try:
-                if item in self.checked_items:
-                    self.change_state(item, "unchecked")
-                else:
-                    self.change_state(item, "checked")
-            except tk.TclError:
-                pass
+            self.set_checked(item, item not in self.checked_items)
+    
+    def row_image(self, key):
+        return self.checkbox_images["checked" if key in self.checked_items else "unchecked"]
+    
+    def set_checked(self, key, checked):
+        if checked:
+            self.checked_items.add(key)
+        else:
+            self.checked_items.discard(key)
+        
+        if key in self.rendered_rows:
+            self.item(key, image=self.row_image(key))
     
     def change_state(self, item, state):
-        try:
-            if state == "checked":
-                self.checked_items.add(item)
-                self.item(item, image=self.checkbox_images["checked"])
-            else:
-                if item in self.checked_items:
-                    self.checked_items.remove(item)
-                self.item(item, image=self.checkbox_images["unchecked"])
-        except tk.TclError:
-            if item in self.checked_items:
-                self.checked_items.remove(item)
+        self.set_checked(item, state == "checked")
     
     def get_checked_items(self):
-        checked_names = []
-        items_to_check = self.checked_items.copy()
-        
-        for item in items_to_check:
-            try:
-                self.item(item)
-                checked_names.append(self.item(item, "text"))
-            except tk.TclError:
-                if item in self.checked_items:
-                    self.checked_items.remove(item)
-        
-        return checked_names
+        if not self.checked_items:
+            return []
+        return [key for key in self.row_keys if key in self.checked_items]
     
     def insert(self, parent, index, iid=None, **kw):
         item = super().insert(parent, index, iid, **kw)
         
         try:
-            self.item(item, image=self.checkbox_images["unchecked"])
+            self.item(item, image=self.row_image(kw.get("text")))
         except tk.TclError:
             pass
         
         return item
     
+    def check_all(self):
+        self.checked_items.update(self.row_keys)
+        self.refresh_images()
+    
+    def uncheck_all(self):
+        self.checked_items.difference_update(self.row_keys)
+        self.refresh_images()
+    
     def clear_all_checks(self):
         self.checked_items.clear()
+        self.refresh_images()
+    
+    def refresh_images(self):
+        for key in self.rendered_order:
+            self.item(key, image=self.row_image(key))
+    
+    def set_rows(self, keys, row_factory):
+        self.row_keys = keys
+        self.row_factory = row_factory
+        self.render()
+    
+    def window_size(self):
+        if not self.virtual:
+            return len(self.row_keys)
+        return self.visible_rows + self.buffer_rows
+    
+    def max_first_row(self):
+        return max(0, len(self.row_keys) - self.visible_rows)
+    
+    def render(self):
+        self.first_row = min(self.first_row, self.max_first_row()) if self.virtual else 0
+        window = list(dict.fromkeys(self.row_keys[self.first_row:self.first_row + self.window_size()]))
+        
+        self.reconcile(window)
+        
+        if self.virtual:
+            super().yview_moveto(0)
+            self.update_scrollbar()
+    
+    def reconcile(self, keys):
+        rendered = self.rendered_rows
+        wanted = set(keys)
+        
+        stale = [key for key in self.rendered_order if key not in wanted]
+        if stale:
+            self.delete(*stale)
+            for key in stale:
+                del rendered[key]
+        
+        survivors = [key for key in self.rendered_order if key in wanted]
+        placed = set()
+        position = 0
+        
+        for index, key in enumerate(keys):
+            while position < len(survivors) and survivors[position] in placed:
+                position += 1
+            
+            values = tuple(self.row_factory(key))
+            if key not in rendered:
+                super().insert("", index, iid=key, text=key, values=values, image=self.row_image(key))
+                rendered[key] = values
+                continue
+            
+            if position < len(survivors) and survivors[position] == key:
+                position += 1
+            else:
+                self.move(key, "", index)
+            placed.add(key)
+            
+            if rendered[key] != values:
+                self.item(key, values=values)
+                rendered[key] = values
+        
+        self.rendered_order = keys
+    
+    def update_scrollbar(self):
+        if not self.virtual_yscrollcommand:
+            return
+        
+        total = len(self.row_keys)
+        if total <= self.visible_rows:
+            first, last = 0.0, 1.0
+        else:
+            first = self.first_row / total
+            last = min(1.0, (self.first_row + self.visible_rows) / total)
+        self.virtual_yscrollcommand(first, last)
+    
+    def scroll_to(self, first_row):
+        first_row = max(0, min(int(first_row), self.max_first_row()))
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.render()
+    
+    def yview(self, *args):
+        if not self.virtual:
+            return super().yview(*args)
+        
+        total = len(self.row_keys)
+        if not args:
+            if not total:
+                return (0.0, 1.0)
+            return (self.first_row / total, min(1.0, (self.first_row + self.visible_rows) / total))
+        
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * total))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, self.visible_rows - 1)
+            self.scroll_to(self.first_row + step)
+        return None
+    
+    def on_virtual_configure(self, event):
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError):
+            row_height = 20
+        
+        visible_rows = max(1, (event.height - 25) // row_height + 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.render()
+    
+    def on_virtual_wheel(self, event, direction=None):
+        if direction is None:
+            delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+            direction = -delta
+        self.scroll_to(self.first_row + direction * 3)
+        return "break"
 
 class EnhancedLotterySystem:
     def __init__(self, root):
@@ -101,15 +259,14 @@ class EnhancedLotterySystem:
         self.lottery_mode = tk.StringVar(value="常规")
         self.num_to_select = tk.StringVar(value="3")
         
-        self.all_students = []
-        self.selected_students = []
-        self.current_round = 1
-        self.last_round_unselected = []
-        self.lottery_history = []
+        self.engine = LotteryEngine()
+        self.search_sessions = {name: SearchSession(self.engine.search_index)
+                                for name in ("roster", "selected", "unselected")}
+        self.search_jobs = {}
         self.is_animating = False
+        self.draw_scheduler = None
+        self.last_animation_metrics = None
         self.student_groups = {}
-        self.student_weights = {}
-        self.import_history = []
         self.animation_window = None
         self.auto_backup = True
         self.data_version = "2.1"
@@ -117,6 +274,11 @@ class EnhancedLotterySystem:
         self.max_backups = 10
         
         self.config_file = "lottery_config.json"
+        self.writer = BackgroundWriter()
+        self.storage = None
+        self.compression = COMPRESSION_NONE
+        self.auto_backup_file = "auto_backup.json"
+        self.backup_store = BackupStore(extra_manifests=[self.auto_backup_file])
         
         self.create_widgets()
         
@@ -127,6 +289,33 @@ class EnhancedLotterySystem:
         self.update_statistics()
         
         self.setup_autosave()
+        self.setup_external_check()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    @property
+    def selected_students(self):
+        return self.engine.selected_students
+    
+    @property
+    def last_round_unselected(self):
+        return self.engine.last_round_unselected
+    
+    @property
+    def lottery_history(self):
+        return self.engine.lottery_history
+    
+    @property
+    def student_weights(self):
+        return self.engine.student_weights
+    
+    @property
+    def import_history(self):
+        return self.engine.import_history
+    
+    @property
+    def current_round(self):
+        return self.engine.current_round
     
     def setup_styles(self):
         style = ttk.Style()
@@ -145,6 +334,15 @@ class EnhancedLotterySystem:
         
         self.root.after(30000, autosave)
     
+    def setup_external_check(self):
+        # 命令行模式（例如定时任务）可能在窗口打开时写入存档，发现后重新加载，不在旧状态上继续写入
+        def check():
+            if not self.is_animating and not self.writer.pending() and self.storage.changed_externally():
+                self.reload_external_state()
+            self.root.after(2000, check)
+        
+        self.root.after(2000, check)
+    
     def load_config(self):
         default_config = {
             'auto_backup': True,
@@ -153,6 +351,8 @@ class EnhancedLotterySystem:
             'animation_speed': '中速',
             'default_lottery_mode': '常规',
             'max_backups': 10,
+            'compression': COMPRESSION_NONE,
+            'storage_backend': 'json',
             'theme': 'default',
             'recent_files': []
         }
@@ -181,6 +381,19 @@ class EnhancedLotterySystem:
         self.show_animation.set(self.config.get('show_animation', True))
         self.animation_speed.set(self.config.get('animation_speed', '中速'))
         self.lottery_mode.set(self.config.get('default_lottery_mode', '常规'))
+        
+        compression = self.config.get('compression', COMPRESSION_NONE)
+        if compression not in COMPRESSION_CHOICES:
+            compression = COMPRESSION_NONE
+        self.compression = compression
+        self.backup_store.compression = compression
+        if self.storage:
+            self.storage.compression = compression
+    
+    def create_storage(self):
+        if self.config.get('storage_backend', 'json') == 'sqlite':
+            return SqliteStore(writer=self.writer, compression=self.compression, state_lock=StateLock())
+        return JournalStore(writer=self.writer, compression=self.compression, state_lock=StateLock())
     
     def create_widgets(self):
         self.create_menu()
@@ -352,7 +565,7 @@ class EnhancedLotterySystem:
         selected_tree_frame = ttk.Frame(selected_frame)
         selected_tree_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.selected_tree = CheckboxTreeview(selected_tree_frame, 
+        self.selected_tree = CheckboxTreeview(selected_tree_frame, virtual=True,
                                              columns=("round", "timestamp", "weight"), 
                                              show="tree headings")
         self.selected_tree.heading("#0", text="✓ 姓名")
@@ -403,7 +616,7 @@ class EnhancedLotterySystem:
         unselected_tree_frame = ttk.Frame(unselected_frame)
         unselected_tree_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.unselected_tree = CheckboxTreeview(unselected_tree_frame, 
+        self.unselected_tree = CheckboxTreeview(unselected_tree_frame, virtual=True,
                                                columns=("status", "weight"), 
                                                show="tree headings")
         self.unselected_tree.heading("#0", text="✓ 姓名")
@@ -438,33 +651,17 @@ class EnhancedLotterySystem:
         self.root.bind('<Control-a>', lambda e: self.select_all_in_focus())
         self.root.bind('<Control-s>', lambda e: self.save_results())
         self.root.bind('<Control-o>', lambda e: self.import_students())
+        self.root.bind('<Control-z>', self.on_undo_key)
+        self.root.bind('<Control-y>', self.on_redo_key)
         
         self.update_history_combo()
     
-    def timing_decorator(func):
-        def wrapper(*args, **kwargs):
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
-            if end_time - start_time > 0.1:
-                print(f"{func.__name__} 执行时间: {end_time - start_time:.3f}秒")
-            return result
-        return wrapper
-    
-    @lru_cache(maxsize=128)
-    def get_student_weight(self, student_name):
-        return self.student_weights.get(student_name, 5)
+    def timing_decorator(name):
+        # 耗时只记入 METRICS，在性能诊断窗口中查看
+        return METRICS.timed(name)
     
-    def batch_update_treeview(self, tree, data, columns):
-        tree.configure(yscrollcommand=None)
-        
-        tree.delete(*tree.get_children())
-        
-        for item_data in data:
-            tree.insert("", tk.END, **item_data)
-        
-        scrollbar = tree.master.winfo_children()[-1]
-        tree.configure(yscrollcommand=scrollbar.set)
+    def get_student_weight(self, student_name):
+        return self.engine.get_student_weight(student_name)
     
     def select_all_in_focus(self):
         focus_widget = self.root.focus_get()
@@ -474,20 +671,16 @@ class EnhancedLotterySystem:
             self.select_all_unselected()
     
     def select_all_selected(self):
-        for item in self.selected_tree.get_children():
-            self.selected_tree.change_state(item, "checked")
+        self.selected_tree.check_all()
     
     def deselect_all_selected(self):
-        for item in self.selected_tree.get_children():
-            self.selected_tree.change_state(item, "unchecked")
+        self.selected_tree.uncheck_all()
     
     def select_all_unselected(self):
-        for item in self.unselected_tree.get_children():
-            self.unselected_tree.change_state(item, "checked")
+        self.unselected_tree.check_all()
     
     def deselect_all_unselected(self):
-        for item in self.unselected_tree.get_children():
-            self.unselected_tree.change_state(item, "unchecked")
+        self.unselected_tree.uncheck_all()
     
     def batch_move_to_unselected(self):
         checked_items = self.selected_tree.get_checked_items()
@@ -495,16 +688,7 @@ class EnhancedLotterySystem:
             messagebox.showinfo("提示", "请先勾选要移回的学生")
             return
         
-        if self.auto_backup:
-            self.auto_backup_data()
-            
-        moved_count = 0
-        for student_name in checked_items:
-            if student_name in self.selected_students:
-                self.selected_students.remove(student_name)
-                if student_name not in self.last_round_unselected:
-                    self.last_round_unselected.append(student_name)
-                moved_count += 1
+        moved_count = self.engine.move_to_unselected(checked_items)
         
         self.selected_tree.clear_all_checks()
         
@@ -520,16 +704,7 @@ class EnhancedLotterySystem:
             messagebox.showinfo("提示", "请先勾选要标记为已抽中的学生")
             return
         
-        if self.auto_backup:
-            self.auto_backup_data()
-            
-        moved_count = 0
-        for student_name in checked_items:
-            if student_name in self.last_round_unselected:
-                self.last_round_unselected.remove(student_name)
-                if student_name not in self.selected_students:
-                    self.selected_students.append(student_name)
-                moved_count += 1
+        moved_count = self.engine.move_to_selected(checked_items)
         
         self.unselected_tree.clear_all_checks()
         
@@ -549,10 +724,13 @@ class EnhancedLotterySystem:
         file_menu.add_command(label="导出结果", command=self.save_results, accelerator="Ctrl+S")
         file_menu.add_command(label="备份管理", command=self.show_backup_manager)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit, accelerator="Ctrl+Q")
+        file_menu.add_command(label="退出", command=self.on_close, accelerator="Ctrl+Q")
         
         edit_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="编辑", menu=edit_menu)
+        edit_menu.add_command(label="撤销", command=self.undo_operation, accelerator="Ctrl+Z")
+        edit_menu.add_command(label="重做", command=self.redo_operation, accelerator="Ctrl+Y")
+        edit_menu.add_separator()
         edit_menu.add_command(label="添加学生", command=self.add_student_dialog)
         edit_menu.add_command(label="批量添加", command=self.batch_add_dialog)
         edit_menu.add_separator()
@@ -568,6 +746,7 @@ class EnhancedLotterySystem:
         tools_menu.add_separator()
         tools_menu.add_command(label="查看历史", command=self.show_history)
         tools_menu.add_command(label="统计报告", command=self.generate_report)
+        tools_menu.add_command(label="性能诊断", command=self.show_diagnostics)
         tools_menu.add_command(label="数据清理", command=self.data_cleanup)
         
         settings_menu = tk.Menu(menubar, tearoff=0)
@@ -590,15 +769,14 @@ class EnhancedLotterySystem:
     
     def on_history_selected(self, event):
         selected_name = self.history_var.get()
-        for record in self.import_history:
-            if record['name'] == selected_name:
-                self.last_round_unselected = record['students'].copy()
-                self.update_unselected_tree()
-                self.update_statistics()
-                self.update_students_text(self.last_round_unselected)
-                
-                self.status_label.config(text=f"已加载历史名单: {selected_name}")
-                break
+        record = self.engine.find_import(selected_name)
+        if record:
+            self.engine.replace_unselected(record['students'])
+            self.update_unselected_tree()
+            self.update_statistics()
+            self.update_students_text(self.last_round_unselected)
+            
+            self.status_label.config(text=f"已加载历史名单: {selected_name}")
     
     def quick_draw_single(self):
         self.num_to_select.set("1")
@@ -608,64 +786,61 @@ class EnhancedLotterySystem:
         self.num_to_select.set(str(count))
         self.start_lottery()
     
-    def on_search(self, event):
-        search_text = self.search_var.get().lower()
-        if not search_text:
-            self.update_unselected_tree()
+    def search_targets(self, name):
+        if name == "selected":
+            return (self.selected_search_var, self.selected_students,
+                    self.selected_tree, self.selected_row_values, self.update_selected_tree)
+        
+        search_var = self.search_var if name == "roster" else self.unselected_search_var
+        return (search_var, self.last_round_unselected,
+                self.unselected_tree, self.unselected_row_values, self.update_unselected_tree)
+    
+    def schedule_search(self, name):
+        job = self.search_jobs.pop(name, None)
+        if job:
+            self.root.after_cancel(job)
+        self.search_jobs[name] = self.root.after(SEARCH_DEBOUNCE_MS, lambda: self.run_search(name))
+    
+    @timing_decorator("搜索")
+    def run_search(self, name):
+        self.search_jobs.pop(name, None)
+        search_var, pool, tree, row_factory, update_tree = self.search_targets(name)
+        
+        matches, total = self.search_sessions[name].search(search_var.get(), pool)
+        if not search_var.get():
+            update_tree()
             return
         
-        filtered_students = [s for s in self.last_round_unselected if search_text in s.lower()]
-        
-        self.unselected_tree.delete(*self.unselected_tree.get_children())
-        for student in filtered_students:
-            self.unselected_tree.insert("", tk.END, text=student, 
-                                      values=("未抽中", self.get_student_weight(student)))
+        tree.set_rows(matches, row_factory)
+        if total > len(matches):
+            self.status_label.config(text=f"找到 {total} 名学生，仅显示前 {len(matches)} 名")
+    
+    def clear_search_box(self, name):
+        job = self.search_jobs.pop(name, None)
+        if job:
+            self.root.after_cancel(job)
+        search_var, pool, tree, row_factory, update_tree = self.search_targets(name)
+        search_var.set("")
+        self.search_sessions[name].reset()
+        update_tree()
+    
+    def on_search(self, event):
+        self.schedule_search("roster")
     
     def clear_search(self):
-        self.search_var.set("")
-        self.update_unselected_tree()
+        self.clear_search_box("roster")
     
     def on_selected_search(self, event):
-        search_text = self.selected_search_var.get().lower()
-        if not search_text:
-            self.update_selected_tree()
-            return
-        
-        filtered_students = [s for s in self.selected_students if search_text in s.lower()]
-        
-        self.selected_tree.delete(*self.selected_tree.get_children())
-        for student in filtered_students:
-            round_num = "未知"
-            timestamp = "未知"
-            for record in self.lottery_history:
-                if student in record["selected"]:
-                    round_num = str(record["round"])
-                    timestamp = record["timestamp"]
-                    break
-            
-            self.selected_tree.insert("", tk.END, text=student, 
-                                   values=(round_num, timestamp, self.get_student_weight(student)))
+        self.schedule_search("selected")
     
     def clear_selected_search(self):
-        self.selected_search_var.set("")
-        self.update_selected_tree()
+        self.clear_search_box("selected")
     
     def on_unselected_search(self, event):
-        search_text = self.unselected_search_var.get().lower()
-        if not search_text:
-            self.update_unselected_tree()
-            return
-        
-        filtered_students = [s for s in self.last_round_unselected if search_text in s.lower()]
-        
-        self.unselected_tree.delete(*self.unselected_tree.get_children())
-        for student in filtered_students:
-            self.unselected_tree.insert("", tk.END, text=student, 
-                                      values=("未抽中", self.get_student_weight(student)))
+        self.schedule_search("unselected")
     
     def clear_unselected_search(self):
-        self.unselected_search_var.set("")
-        self.update_unselected_tree()
+        self.clear_search_box("unselected")
     
     def quick_draw(self):
         if not self.last_round_unselected:
@@ -696,25 +871,12 @@ class EnhancedLotterySystem:
                     messagebox.showwarning("警告", f"抽取人数不能超过未抽中人数 {len(self.last_round_unselected)}")
                     return
                 
-                if self.auto_backup:
-                    self.auto_backup_data()
-                
-                selected = random.sample(self.last_round_unselected, num)
-                self.selected_students.extend(selected)
-                
-                self.last_round_unselected = [student for student in self.last_round_unselected if student not in selected]
-                
-                self.lottery_history.append({
-                    "round": self.current_round,
-                    "selected": selected,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "mode": "一键抽取"
-                })
+                with METRICS.span("一键抽取"):
+                    selected = self.engine.draw(num, MODE_QUICK)
                 
                 self.update_selected_tree()
                 self.update_unselected_tree()
                 
-                self.current_round += 1
                 self.round_label.config(text=str(self.current_round))
                 
                 self.update_statistics()
@@ -791,7 +953,7 @@ class EnhancedLotterySystem:
                         if 1 <= new_weight <= 10:
                             weight_tree.set(item, column="weight", value=new_weight)
                             student_name = weight_tree.item(item, "text")
-                            self.student_weights[student_name] = new_weight
+                            self.engine.set_weight(student_name, new_weight)
                             entry.destroy()
                         else:
                             messagebox.showwarning("警告", "权重必须在1-10之间")
@@ -818,12 +980,12 @@ class EnhancedLotterySystem:
     def apply_default_weights(self, weight_tree):
         for item in weight_tree.get_children():
             student_name = weight_tree.item(item, "text")
-            self.student_weights[student_name] = 5
+            self.engine.set_weight(student_name, DEFAULT_WEIGHT)
             weight_tree.set(item, column="weight", value=5)
     
     def reset_weights(self):
         if messagebox.askyesno("确认", "确定要重置所有权重吗？"):
-            self.student_weights = {}
+            self.engine.reset_weights()
             self.update_unselected_tree()
             self.status_label.config(text="已重置所有权重")
     
@@ -832,21 +994,7 @@ class EnhancedLotterySystem:
             messagebox.showinfo("提示", "没有学生可以启用智能平衡")
             return
         
-        selection_count = {}
-        all_students = set(self.last_round_unselected + self.selected_students)
-        
-        for student in all_students:
-            selection_count[student] = 0
-        
-        for record in self.lottery_history:
-            for student in record["selected"]:
-                if student in selection_count:
-                    selection_count[student] += 1
-        
-        for student in self.last_round_unselected:
-            count = selection_count.get(student, 0)
-            new_weight = max(1, min(10, 10 - count))
-            self.student_weights[student] = new_weight
+        self.engine.smart_balance()
         
         self.update_unselected_tree()
         self.status_label.config(text="已启用智能平衡，根据历史抽签记录调整了权重")
@@ -869,21 +1017,7 @@ class EnhancedLotterySystem:
             if content:
                 students = [name.strip() for name in content.split('\n') if name.strip()]
                 
-                current_students = set(self.last_round_unselected + self.selected_students)
-                new_students = []
-                duplicates = 0
-                
-                for student in students:
-                    if student not in current_students:
-                        new_students.append(student)
-                        current_students.add(student)
-                    else:
-                        duplicates += 1
-                
-                if self.auto_backup:
-                    self.auto_backup_data()
-                
-                self.last_round_unselected.extend(new_students)
+                new_students, duplicates = self.engine.add_students(students)
                 
                 self.update_unselected_tree()
                 self.update_statistics()
@@ -905,64 +1039,45 @@ class EnhancedLotterySystem:
         ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT)
     
     def auto_backup_data(self):
-        backup = {
-            'selected': self.selected_students.copy(),
-            'unselected': self.last_round_unselected.copy(),
-            'round': self.current_round,
-            'history': self.lottery_history.copy(),
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        state = self.engine.to_dict()
+        backup = {key: state[key] for key in ('students', 'selected', 'unselected', 'round', 'history')}
+        metadata = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'total_students': len(backup['selected']) + len(backup['unselected'])
         }
         
-        try:
-            with open("auto_backup.json", 'w', encoding='utf-8') as file:
-                json.dump(backup, file, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"自动备份时出错: {str(e)}")
+        def write_backup():
+            try:
+                self.backup_store.write_backup(self.auto_backup_file, backup, metadata)
+                if self.backup_store.writes_since_gc >= self.backup_store.gc_interval:
+                    self.backup_store.collect_garbage()
+            except Exception as e:
+                print(f"自动备份时出错: {str(e)}")
+        
+        self.writer.submit(write_backup, key="auto_backup")
     
     def enhanced_auto_backup(self):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_data = {
+        backup_data = self.engine.to_dict()
+        metadata = {
             'version': self.data_version,
-            'selected': self.selected_students.copy(),
-            'unselected': self.last_round_unselected.copy(),
-            'round': self.current_round,
-            'history': self.lottery_history.copy(),
-            'weights': self.student_weights.copy(),
-            'import_history': self.import_history.copy(),
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'backup_id': f"backup_{timestamp}"
+            'backup_id': f"backup_{timestamp}",
+            'total_students': len(backup_data['selected']) + len(backup_data['unselected'])
         }
         
-        try:
-            if not os.path.exists("backups"):
-                os.makedirs("backups")
-            
-            backup_file = f"backups/backup_{timestamp}.json"
-            with open(backup_file, 'w', encoding='utf-8') as file:
-                json.dump(backup_data, file, ensure_ascii=False, indent=2)
-            
-            self.rotate_backups()
-            
-            self.backup_count += 1
-        except Exception as e:
-            print(f"增强备份时出错: {str(e)}")
+        def write_backup():
+            try:
+                self.backup_store.create_backup(f"backup_{timestamp}", backup_data, metadata, self.max_backups)
+            except Exception as e:
+                print(f"增强备份时出错: {str(e)}")
+        
+        self.writer.submit(write_backup)
+        self.backup_count += 1
     
     def rotate_backups(self):
         try:
-            if not os.path.exists("backups"):
-                return
-            
-            backup_files = []
-            for file in os.listdir("backups"):
-                if file.startswith("backup_") and file.endswith(".json"):
-                    file_path = os.path.join("backups", file)
-                    backup_files.append((file_path, os.path.getctime(file_path)))
-            
-            backup_files.sort(key=lambda x: x[1])
-            
-            while len(backup_files) > self.max_backups:
-                oldest_file = backup_files.pop(0)[0]
-                os.remove(oldest_file)
+            self.backup_store.rotate(self.max_backups)
         except Exception as e:
             print(f"备份轮转时出错: {str(e)}")
     
@@ -976,34 +1091,43 @@ class EnhancedLotterySystem:
         tree_frame = ttk.Frame(dialog)
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        backup_tree = ttk.Treeview(tree_frame, columns=("timestamp", "students", "round"), show="headings")
+        backup_tree = ttk.Treeview(tree_frame, columns=("timestamp", "students", "round", "size"), show="headings")
         backup_tree.heading("timestamp", text="备份时间")
         backup_tree.heading("students", text="学生数量")
         backup_tree.heading("round", text="轮次")
+        backup_tree.heading("size", text="清单大小")
         backup_tree.column("timestamp", width=150)
         backup_tree.column("students", width=100)
         backup_tree.column("round", width=80)
+        backup_tree.column("size", width=80)
         
-        backup_files = []
-        if os.path.exists("backups"):
-            for file in os.listdir("backups"):
-                if file.startswith("backup_") and file.endswith(".json"):
-                    file_path = os.path.join("backups", file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            backup_files.append((file_path, data))
-                    except:
-                        continue
-        
-        backup_files.sort(key=lambda x: x[1].get('timestamp', ''), reverse=True)
-        
-        for file_path, data in backup_files:
-            timestamp = data.get('timestamp', '未知')
-            total_students = len(data.get('selected', [])) + len(data.get('unselected', []))
-            round_num = data.get('round', 1)
+        def fill_backups():
+            try:
+                backup_entries = self.backup_store.list_backups()
+            except Exception as e:
+                print(f"读取备份索引时出错: {str(e)}")
+                backup_entries = []
+            
+            backup_entries.sort(key=lambda entry: entry.get('timestamp', ''), reverse=True)
             
-            backup_tree.insert("", tk.END, values=(timestamp, total_students, round_num), tags=(file_path,))
+            backup_tree.delete(*backup_tree.get_children())
+            for entry in backup_entries:
+                file_path = self.backup_store.backup_path(entry)
+                size_text = f"{entry.get('size', 0) / 1024:.1f} KB"
+                
+                backup_tree.insert("", tk.END, values=(entry.get('timestamp', '未知'), entry.get('total_students', 0),
+                                                     entry.get('round', 1), size_text), tags=(file_path,))
+        
+        def refresh_when_idle():
+            # 先按当前索引显示，后台仍有备份在写入时轮询，写完后再刷新一次列表
+            if not dialog.winfo_exists():
+                return
+            if self.writer.pending():
+                status_label.config(text="正在写入备份...")
+                dialog.after(100, refresh_when_idle)
+                return
+            status_label.config(text="")
+            fill_backups()
         
         scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=backup_tree.yview)
         backup_tree.configure(yscrollcommand=scrollbar.set)
@@ -1028,26 +1152,31 @@ class EnhancedLotterySystem:
                 file_path = backup_tree.item(selection[0], "tags")[0]
                 if messagebox.askyesno("确认", "确定要删除此备份吗？"):
                     try:
-                        os.remove(file_path)
+                        self.backup_store.delete_backup(file_path)
                         backup_tree.delete(selection[0])
                     except Exception as e:
                         messagebox.showerror("错误", f"删除备份时出错: {str(e)}")
         
         ttk.Button(btn_frame, text="恢复备份", command=restore_backup).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(btn_frame, text="删除备份", command=delete_backup).pack(side=tk.LEFT, padx=(0, 5))
+        status_label = ttk.Label(btn_frame, text="")
+        status_label.pack(side=tk.LEFT, padx=(5, 0))
         ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        fill_backups()
+        if self.writer.pending():
+            refresh_when_idle()
     
     def restore_from_backup(self, backup_file):
         try:
-            with open(backup_file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                
-            self.selected_students = data.get('selected', [])
-            self.last_round_unselected = data.get('unselected', [])
-            self.current_round = data.get('round', 1)
-            self.lottery_history = data.get('history', [])
-            self.student_weights = data.get('weights', {})
-            self.import_history = data.get('import_history', [])
+            if not self.backup_store.verify(backup_file):
+                messagebox.showerror("错误", "备份文件校验失败，文件可能已损坏")
+                return
+            
+            data = self.backup_store.read_backup(backup_file)
+            
+            self.engine.load_dict(data)
+            self.save_unselected(force=True)
             
             self.update_students_text(self.last_round_unselected)
             self.update_selected_tree()
@@ -1063,7 +1192,7 @@ class EnhancedLotterySystem:
     def show_settings(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("系统设置")
-        dialog.geometry("400x300")
+        dialog.geometry("400x400")
         dialog.transient(self.root)
         dialog.grab_set()
         
@@ -1079,6 +1208,21 @@ class EnhancedLotterySystem:
         self.auto_backup_var = tk.BooleanVar(value=self.config.get('auto_backup', True))
         ttk.Checkbutton(backup_frame, text="重要操作前自动备份", variable=self.auto_backup_var).pack(anchor=tk.W)
         
+        compression_row = ttk.Frame(backup_frame)
+        compression_row.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(compression_row, text="存档压缩:").pack(side=tk.LEFT)
+        compression_var = tk.StringVar(value=self.config.get('compression', COMPRESSION_NONE))
+        ttk.Combobox(compression_row, textvariable=compression_var, values=COMPRESSION_CHOICES,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=(5, 0))
+        
+        backend_row = ttk.Frame(backup_frame)
+        backend_row.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(backend_row, text="存储方式:").pack(side=tk.LEFT)
+        backend_var = tk.StringVar(value=self.config.get('storage_backend', 'json'))
+        ttk.Combobox(backend_row, textvariable=backend_var, values=("json", "sqlite"),
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(backend_row, text="(重启后生效)").pack(side=tk.LEFT, padx=(5, 0))
+        
         export_frame = ttk.LabelFrame(dialog, text="导出设置", padding="10")
         export_frame.pack(fill=tk.X, padx=10, pady=10)
         
@@ -1092,7 +1236,12 @@ class EnhancedLotterySystem:
             self.config['auto_save'] = self.auto_save.get()
             self.config['auto_backup'] = self.auto_backup_var.get()
             self.config['include_timestamp'] = self.include_timestamp.get()
+            self.config['compression'] = compression_var.get()
+            self.config['storage_backend'] = backend_var.get()
             self.auto_backup = self.auto_backup_var.get()
+            self.compression = compression_var.get()
+            self.storage.compression = self.compression
+            self.backup_store.compression = self.compression
             self.save_config()
             dialog.destroy()
         
@@ -1104,27 +1253,7 @@ class EnhancedLotterySystem:
             messagebox.showinfo("提示", "没有数据可以生成报告")
             return
         
-        total = len(self.selected_students) + len(self.last_round_unselected)
-        selected_count = len(self.selected_students)
-        unselected_count = len(self.last_round_unselected)
-        
-        selection_frequency = {}
-        for record in self.lottery_history:
-            for student in record["selected"]:
-                selection_frequency[student] = selection_frequency.get(student, 0) + 1
-        
-        report = "抽签系统统计报告\n"
-        report += "=" * 40 + "\n"
-        report += f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        report += f"总抽签轮次: {self.current_round - 1}\n"
-        report += f"总人数: {total}\n"
-        report += f"已抽中人数: {selected_count}\n"
-        report += f"未抽中人数: {unselected_count}\n\n"
-        
-        report += "抽签频率统计:\n"
-        report += "-" * 20 + "\n"
-        for student, count in sorted(selection_frequency.items(), key=lambda x: x[1], reverse=True):
-            report += f"{student}: {count}次\n"
+        data = ReportData(self.engine)
         
         report_window = tk.Toplevel(self.root)
         report_window.title("统计报告")
@@ -1132,28 +1261,170 @@ class EnhancedLotterySystem:
         
         text_area = scrolledtext.ScrolledText(report_window, wrap=tk.WORD, width=60, height=20)
         text_area.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
-        text_area.insert(1.0, report)
+        text_area.insert(1.0, "\n".join(data.summary_lines() + ["抽签频率统计:", "-" * 20, ""]))
         text_area.config(state=tk.DISABLED)
         
         export_frame = ttk.Frame(report_window)
         export_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        ttk.Button(export_frame, text="导出报告", command=lambda: self.export_report(report)).pack(side=tk.RIGHT)
+        progress_label = ttk.Label(export_frame, text="正在统计抽签频率...")
+        progress_label.pack(side=tk.LEFT)
+        
+        job = BackgroundJob(lambda job: data.frequency()).start()
+        
+        def show_frequency():
+            if not report_window.winfo_exists():
+                return
+            if not job.done:
+                report_window.after(100, show_frequency)
+                return
+            
+            if job.error is not None:
+                progress_label.config(text=f"统计时出错: {str(job.error)}")
+                return
+            
+            frequency = job.result
+            lines = [f"{student}: {count}次" for student, count in frequency[:REPORT_PREVIEW_ROWS]]
+            if len(frequency) > REPORT_PREVIEW_ROWS:
+                lines.append(f"…… 仅显示前 {REPORT_PREVIEW_ROWS} 名，完整统计请导出报告")
+            
+            text_area.config(state=tk.NORMAL)
+            text_area.insert(tk.END, "\n".join(lines))
+            text_area.config(state=tk.DISABLED)
+            progress_label.config(text=f"共 {len(frequency)} 名学生有抽中记录")
+        
+        show_frequency()
+        
+        ttk.Button(export_frame, text="导出报告",
+                   command=lambda: self.export_report(data, job.result if job.done else None)).pack(side=tk.RIGHT)
+    
+    def diagnostics_extra(self):
+        return {
+            'animation': self.last_animation_metrics,
+            'environment': {
+                'total_students': self.engine.total_count,
+                'history_rounds': len(self.lottery_history),
+                'storage_backend': self.config.get('storage_backend', 'json'),
+                'compression': self.compression
+            }
+        }
+    
+    def show_diagnostics(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("性能诊断")
+        dialog.geometry("640x420")
+        dialog.transient(self.root)
+        
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        metrics_tree = ttk.Treeview(tree_frame, columns=("count", "p50", "p95", "max", "mean"), show="tree headings")
+        metrics_tree.heading("#0", text="操作")
+        metrics_tree.heading("count", text="次数")
+        metrics_tree.heading("p50", text="p50 (毫秒)")
+        metrics_tree.heading("p95", text="p95 (毫秒)")
+        metrics_tree.heading("max", text="最大 (毫秒)")
+        metrics_tree.heading("mean", text="平均 (毫秒)")
+        metrics_tree.column("#0", width=140)
+        for column in ("count", "p50", "p95", "max", "mean"):
+            metrics_tree.column(column, width=90, anchor=tk.E)
+        
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=metrics_tree.yview)
+        metrics_tree.configure(yscrollcommand=scrollbar.set)
+        metrics_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        animation_label = ttk.Label(dialog, text="")
+        animation_label.pack(anchor=tk.W, padx=10)
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            metrics_tree.delete(*metrics_tree.get_children())
+            # 按 p95 从高到低排列，最拖慢界面的操作排在最前面
+            summary = sorted(METRICS.summary().items(), key=lambda item: item[1]['p95_ms'], reverse=True)
+            for name, stats in summary:
+                metrics_tree.insert("", tk.END, text=name, values=(
+                    stats['count'], f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}",
+                    f"{stats['max_ms']:.1f}", f"{stats['mean_ms']:.1f}"))
+            
+            animation = self.last_animation_metrics
+            if animation:
+                animation_label.config(text=(
+                    f"最近一次抽签动画: 渲染 {animation['rendered_frames']} 帧，掉帧 {animation['dropped_frames']} 帧，"
+                    f"最大帧耗时 {animation['max_frame_cost_ms']:.1f} 毫秒，最大抖动 {animation['max_jitter_ms']:.1f} 毫秒"))
+            else:
+                animation_label.config(text="最近一次抽签动画: 暂无数据")
+            dialog.after(1000, refresh)
+        
+        def clear_metrics():
+            METRICS.reset()
+            self.last_animation_metrics = None
+        
+        def export_metrics():
+            file_path = filedialog.asksaveasfilename(
+                title="导出性能数据",
+                defaultextension=".json",
+                filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+            )
+            if not file_path:
+                return
+            try:
+                METRICS.export_json(file_path, self.diagnostics_extra())
+                messagebox.showinfo("成功", f"性能数据已导出到: {file_path}")
+            except Exception as e:
+                messagebox.showerror("错误", f"导出性能数据时出错: {str(e)}")
+        
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(btn_frame, text="导出JSON", command=export_metrics).pack(side=tk.LEFT)
+        ttk.Button(btn_frame, text="清空", command=clear_metrics).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(btn_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        refresh()
     
-    def export_report(self, report):
+    def export_report(self, data, frequency=None):
         file_path = filedialog.asksaveasfilename(
             title="导出报告",
             defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
+            filetypes=[("文本文件", "*.txt"), ("CSV文件", "*.csv"), ("所有文件", "*.*")]
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(report)
-                messagebox.showinfo("成功", f"报告已导出到: {file_path}")
-            except Exception as e:
-                messagebox.showerror("错误", f"导出报告时出错: {str(e)}")
+            self.run_export_job(export_report_job(data, file_path, frequency), f"报告已导出到: {file_path}")
+    
+    def run_export_job(self, job, success_message):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("正在导出")
+        dialog.geometry("360x130")
+        dialog.transient(self.root)
+        
+        progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(dialog, variable=progress_var, maximum=100).pack(fill=tk.X, padx=10, pady=(15, 5))
+        progress_label = ttk.Label(dialog, text="正在导出...")
+        progress_label.pack(anchor=tk.W, padx=10)
+        
+        ttk.Button(dialog, text="取消", command=job.cancel).pack(side=tk.RIGHT, padx=10, pady=10)
+        dialog.protocol("WM_DELETE_WINDOW", job.cancel)
+        
+        job.start()
+        
+        def poll():
+            progress_var.set(job.progress * 100)
+            progress_label.config(text=f"正在导出... {job.completed}/{job.total}")
+            if not job.done:
+                dialog.after(100, poll)
+                return
+            
+            dialog.destroy()
+            if job.error is not None:
+                messagebox.showerror("错误", f"导出文件时出错: {str(job.error)}")
+            elif job.result is None:
+                self.status_label.config(text="导出已取消")
+            else:
+                messagebox.showinfo("成功", success_message)
+        
+        poll()
     
     def data_cleanup(self):
         if not self.selected_students and not self.last_round_unselected:
@@ -1193,12 +1464,7 @@ class EnhancedLotterySystem:
                 return
             
             if option == "duplicates":
-                original_total = total_count
-                self.selected_students = list(dict.fromkeys(self.selected_students))
-                self.last_round_unselected = list(dict.fromkeys(self.last_round_unselected))
-                
-                new_total = len(self.selected_students) + len(self.last_round_unselected)
-                removed = original_total - new_total
+                removed = self.engine.remove_duplicates()
                 
                 self.update_selected_tree()
                 self.update_unselected_tree()
@@ -1207,8 +1473,7 @@ class EnhancedLotterySystem:
                 messagebox.showinfo("完成", f"已清理 {removed} 个重复学生")
                 
             elif option == "empty":
-                self.selected_students = [s for s in self.selected_students if s.strip()]
-                self.last_round_unselected = [s for s in self.last_round_unselected if s.strip()]
+                self.engine.remove_empty()
                 
                 self.update_selected_tree()
                 self.update_unselected_tree()
@@ -1218,11 +1483,7 @@ class EnhancedLotterySystem:
                 
             elif option == "reset":
                 if messagebox.askyesno("确认", "确定要重置所有数据吗？此操作不可撤销"):
-                    self.selected_students = []
-                    self.last_round_unselected = []
-                    self.lottery_history = []
-                    self.current_round = 1
-                    self.student_weights = {}
+                    self.engine.reset(clear_weights=True)
                     
                     self.update_selected_tree()
                     self.update_unselected_tree()
@@ -1284,6 +1545,8 @@ class EnhancedLotterySystem:
    - Ctrl+A: 全选当前列表
    - Ctrl+S: 保存结果
    - Ctrl+O: 导入名单
+   - Ctrl+Z: 撤销上一步操作
+   - Ctrl+Y: 重做
 """
         messagebox.showinfo("使用说明", help_text)
     
@@ -1296,6 +1559,8 @@ F5          - 重置系统
 Ctrl+A      - 全选当前列表
 Ctrl+S      - 保存结果
 Ctrl+O      - 导入名单
+Ctrl+Z      - 撤销
+Ctrl+Y      - 重做
 Ctrl+Shift+A - 全选已抽中学生
 Ctrl+Shift+U - 全选未抽中学生
 """
@@ -1324,16 +1589,10 @@ Ctrl+Shift+U - 全选未抽中学生
         messagebox.showinfo("关于", about_text)
     
     def on_selected_double_click(self, event):
-        item = self.selected_tree.identify_row(event.y)
-        if item:
-            student_name = self.selected_tree.item(item, "text")
+        student_name = self.selected_tree.identify_row(event.y)
+        if student_name:
             if messagebox.askyesno("确认", f"确定要将 {student_name} 移回未抽中名单吗？"):
-                if self.auto_backup:
-                    self.auto_backup_data()
-                
-                self.selected_students = [s for s in self.selected_students if s != student_name]
-                if student_name not in self.last_round_unselected:
-                    self.last_round_unselected.append(student_name)
+                self.engine.move_to_unselected([student_name])
                 
                 self.update_selected_tree()
                 self.update_unselected_tree()
@@ -1342,16 +1601,10 @@ Ctrl+Shift+U - 全选未抽中学生
                 self.status_label.config(text=f"已将 {student_name} 移回未抽中名单")
     
     def on_unselected_double_click(self, event):
-        item = self.unselected_tree.identify_row(event.y)
-        if item:
-            student_name = self.unselected_tree.item(item, "text")
+        student_name = self.unselected_tree.identify_row(event.y)
+        if student_name:
             if messagebox.askyesno("确认", f"确定要手动将 {student_name} 标记为已抽中吗？"):
-                if self.auto_backup:
-                    self.auto_backup_data()
-                
-                self.last_round_unselected = [s for s in self.last_round_unselected if s != student_name]
-                if student_name not in self.selected_students:
-                    self.selected_students.append(student_name)
+                self.engine.move_to_selected([student_name])
                 
                 self.update_selected_tree()
                 self.update_unselected_tree()
@@ -1375,15 +1628,11 @@ Ctrl+Shift+U - 全选未抽中学生
         def add_student():
             name = name_var.get().strip()
             if name:
-                if name in self.last_round_unselected or name in self.selected_students:
+                if self.engine.contains(name):
                     messagebox.showwarning("警告", f"学生 '{name}' 已存在")
                     return
                 
-                if self.auto_backup:
-                    self.auto_backup_data()
-                
-                if name not in self.last_round_unselected and name not in self.selected_students:
-                    self.last_round_unselected.append(name)
+                self.engine.add_students([name])
                 
                 self.update_unselected_tree()
                 self.update_statistics()
@@ -1406,10 +1655,7 @@ Ctrl+Shift+U - 全选未抽中学生
             messagebox.showinfo("提示", "没有需要打乱的学生名单")
             return
         
-        if self.auto_backup:
-            self.auto_backup_data()
-        
-        random.shuffle(self.last_round_unselected)
+        self.engine.shuffle()
         self.update_unselected_tree()
         self.update_students_text(self.last_round_unselected)
         self.status_label.config(text="学生名单已随机打乱")
@@ -1433,59 +1679,140 @@ Ctrl+Shift+U - 全选未抽中学生
         )
         
         if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    students = [line.strip() for line in file if line.strip()]
+            self.show_import_dialog(file_path)
+    
+    def show_import_dialog(self, file_path):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("导入名单")
+        dialog.geometry("420x260")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        options_frame = ttk.LabelFrame(dialog, text=os.path.basename(file_path), padding="10")
+        options_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        ttk.Label(options_frame, text="文件编码:").grid(row=0, column=0, sticky=tk.W)
+        encoding_var = tk.StringVar(value=ENCODING_AUTO)
+        ttk.Combobox(options_frame, textvariable=encoding_var, values=ENCODING_CHOICES,
+                     state="readonly", width=12).grid(row=0, column=1, sticky=tk.W, padx=(5, 0))
+        
+        column_var = tk.StringVar()
+        header_var = tk.BooleanVar(value=True)
+        columns = []
+        
+        if is_csv(file_path):
+            ttk.Label(options_frame, text="姓名列:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+            column_combo = ttk.Combobox(options_frame, textvariable=column_var, state="readonly", width=24)
+            column_combo.grid(row=1, column=1, sticky=tk.W, padx=(5, 0), pady=(5, 0))
+            ttk.Checkbutton(options_frame, text="首行为表头", variable=header_var).grid(
+                row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+            
+            def load_columns(*args):
+                encoding = encoding_var.get()
+                try:
+                    header = read_header(file_path, detect_encoding(file_path) if encoding == ENCODING_AUTO else encoding)
+                except (OSError, UnicodeDecodeError):
+                    header = []
                 
-                if students:
-                    if self.auto_backup:
-                        self.auto_backup_data()
-                    
-                    current_students = set(self.last_round_unselected + self.selected_students)
-                    new_students = []
-                    duplicates = 0
-                    
-                    for student in students:
-                        if student not in current_students:
-                            new_students.append(student)
-                            current_students.add(student)
-                        else:
-                            duplicates += 1
-                    
-                    self.last_round_unselected.extend(new_students)
-                    self.update_unselected_tree()
-                    self.update_statistics()
-                    self.update_students_text(self.last_round_unselected)
-                    
-                    file_name = os.path.basename(file_path)
-                    self.import_history.append({
-                        'name': file_name,
-                        'path': file_path,
-                        'students': new_students.copy(),
-                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    
-                    self.update_history_combo()
-                    
-                    if duplicates > 0:
-                        self.status_label.config(text=f"成功导入 {len(new_students)} 名学生，跳过 {duplicates} 个重复项")
-                    else:
-                        self.status_label.config(text=f"成功导入 {len(new_students)} 名学生")
-                else:
-                    messagebox.showwarning("警告", "文件为空或格式不正确")
+                columns[:] = [f"{i + 1}: {name}" for i, name in enumerate(header)]
+                column_combo['values'] = columns
+                if columns:
+                    name_columns = [c for c, name in zip(columns, header) if "姓名" in name or "name" in name.lower()]
+                    column_var.set(name_columns[0] if name_columns else columns[0])
+            
+            encoding_var.trace_add("write", load_columns)
+            load_columns()
+        
+        progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(dialog, variable=progress_var, maximum=100).pack(fill=tk.X, padx=10)
+        progress_label = ttk.Label(dialog, text="")
+        progress_label.pack(anchor=tk.W, padx=10, pady=(5, 0))
+        
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        job = {'importer': None, 'cancelled': False, 'started': None}
+        
+        def finish(error=None):
+            importer = job['importer']
+            importer.close()
+            METRICS.record("导入名单", (time.perf_counter() - job['started']) * 1000)
+            dialog.destroy()
+            
+            # 出错时与命令行模式一致，不保留已读取的部分名单
+            if error is not None:
+                messagebox.showerror("错误", f"读取文件时出错: {str(error)}")
+                return
+            if job['cancelled']:
+                if not importer.added or not messagebox.askyesno(
+                        "确认", f"导入已取消，已读取 {len(importer.added)} 名新学生，是否保留这部分名单？"):
+                    self.status_label.config(text="导入已取消，名单未修改")
+                    return
+            elif not importer.added and not importer.duplicates:
+                messagebox.showwarning("警告", "文件为空或格式不正确")
+                return
+            
+            if importer.added:
+                self.engine.record_import(os.path.basename(file_path), file_path, importer.added)
+                self.update_unselected_tree()
+                self.update_statistics()
+                self.update_students_text(self.last_round_unselected)
+                self.update_history_combo()
+            
+            status = f"成功导入 {len(importer.added)} 名学生"
+            if importer.duplicates > 0:
+                status += f"，跳过 {importer.duplicates} 个重复项"
+            if job['cancelled']:
+                status += "（导入已取消，保留了已读取的部分）"
+            self.status_label.config(text=status)
+        
+        def step():
+            importer = job['importer']
+            try:
+                more = importer.step()
+            except Exception as e:
+                finish(e)
+                return
+            
+            progress_var.set(importer.progress * 100)
+            progress_label.config(text=f"已读取 {importer.lines} 行，新增 {len(importer.added)} 人，重复 {importer.duplicates} 人")
+            
+            if more and not job['cancelled']:
+                # 每块之间让出事件循环，界面在导入大文件时保持响应
+                self.root.after(1, step)
+            else:
+                finish()
+        
+        def start_import():
+            column = columns.index(column_var.get()) if column_var.get() in columns else 0
+            try:
+                job['importer'] = RosterImporter(self.engine, file_path, encoding_var.get(),
+                                                 column=column, has_header=header_var.get() and bool(columns))
             except Exception as e:
                 messagebox.showerror("错误", f"读取文件时出错: {str(e)}")
+                return
+            
+            start_button.config(state=tk.DISABLED)
+            job['started'] = time.perf_counter()
+            self.root.after(1, step)
+        
+        def cancel_import():
+            if job['importer'] and not job['importer'].done:
+                job['cancelled'] = True
+            else:
+                dialog.destroy()
+        
+        dialog.protocol("WM_DELETE_WINDOW", cancel_import)
+        start_button = ttk.Button(btn_frame, text="开始导入", command=start_import)
+        start_button.pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(btn_frame, text="取消", command=cancel_import).pack(side=tk.RIGHT, padx=(5, 0))
     
     def clear_students(self):
         if messagebox.askyesno("确认", "确定要清空所有学生名单吗？"):
             if self.auto_backup:
                 self.auto_backup_data()
             
-            self.all_students = []
-            self.selected_students = []
-            self.current_round = 1
-            self.last_round_unselected = []
-            self.lottery_history = []
+            self.engine.reset()
             self.update_selected_tree()
             self.update_unselected_tree()
             self.update_statistics()
@@ -1493,6 +1820,7 @@ Ctrl+Shift+U - 全选未抽中学生
             self.update_students_text([])
             self.status_label.config(text="已清空所有名单")
     
+    @timing_decorator("开始抽签")
     def start_lottery(self):
         if self.is_animating:
             return
@@ -1514,57 +1842,51 @@ Ctrl+Shift+U - 全选未抽中学生
             messagebox.showwarning("警告", f"抽取人数不能超过未抽中人数 {len(self.last_round_unselected)}")
             return
         
-        if self.auto_backup:
-            self.auto_backup_data()
+        mode = self.lottery_mode.get()
+        try:
+            # 抽签结果在动画开始前一次性确定，动画只负责展示
+            selected = self.engine.pick(num_to_select, mode)
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            return
         
         self.progress.pack(fill=tk.X, pady=(5, 0))
         self.progress.start()
         self.is_animating = True
         
-        threading.Thread(target=self.animate_lottery, args=(num_to_select,), daemon=True).start()
-    
-    def animate_lottery(self, num_to_select):
-        speed_map = {"慢速": 0.2, "中速": 0.1, "快速": 0.05}
-        delay = speed_map.get(self.animation_speed.get(), 0.1)
-        iterations = 20
-        
-        temp_students = self.last_round_unselected.copy()
-        
-        if self.show_animation.get():
-            self.root.after(0, self.create_enhanced_animation)
-        
-        for i in range(iterations):
-            if not self.is_animating:
-                return
-                
-            random.shuffle(temp_students)
-            display_text = " >>> ".join(temp_students[:5])
-            self.root.after(0, lambda: self.status_label.config(text=f"抽签中... {display_text}"))
-            
-            if self.show_animation.get() and self.animation_window:
-                self.root.after(0, lambda: self.enhanced_update_animation(temp_students[:3]))
-            
-            time.sleep(delay)
+        show_window = self.show_animation.get()
+        if show_window:
+            self.create_enhanced_animation()
         
-        if self.lottery_mode.get() == "权重模式":
-            selected = self.weighted_lottery(num_to_select)
-        elif self.lottery_mode.get() == "公平模式":
-            selected = self.fair_lottery(num_to_select)
-        else:
-            selected = random.sample(self.last_round_unselected, num_to_select)
+        frames = list(animation_frames(self.last_round_unselected.as_list(), ANIMATION_FRAMES))
         
-        self.selected_students.extend(selected)
+        def render_frame(index):
+            names = frames[index]
+            self.status_label.config(text=f"抽签中... {' >>> '.join(names)}")
+            if show_window and self.animation_window:
+                self.enhanced_update_animation(names[:3])
         
-        self.last_round_unselected = [student for student in self.last_round_unselected if student not in selected]
+        frame_ms = FRAME_BUDGETS_MS.get(self.animation_speed.get(), DEFAULT_FRAME_MS)
+        self.draw_scheduler = FrameScheduler(self.root, frame_ms, ANIMATION_FRAMES, render_frame,
+                                             lambda: self.complete_draw(num_to_select, selected, mode))
+        self.draw_scheduler.start()
+    
+    @timing_decorator("完成抽签")
+    def complete_draw(self, num_to_select, selected, mode):
+        self.last_animation_metrics = self.draw_scheduler.metrics()
+        self.draw_scheduler = None
         
-        self.lottery_history.append({
-            "round": self.current_round,
-            "selected": selected,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "mode": self.lottery_mode.get()
-        })
+        if any(student not in self.last_round_unselected for student in selected):
+            # 动画期间名单被修改过，按当前名单重新抽取
+            try:
+                selected = self.engine.pick(num_to_select, mode)
+            except ValueError as e:
+                self.stop_draw()
+                messagebox.showwarning("警告", str(e))
+                return
         
-        self.root.after(0, self.finish_lottery, selected)
+        self.engine.commit_draw(selected, mode)
+        self.finish_lottery(selected)
     
     def create_enhanced_animation(self):
         if not self.show_animation.get():
@@ -1603,9 +1925,17 @@ Ctrl+Shift+U - 全选未抽中学生
         close_btn.pack(pady=10)
     
     def cancel_animation(self):
+        if self.draw_scheduler:
+            self.draw_scheduler.cancel()
+            self.draw_scheduler = None
+        self.stop_draw()
+        self.status_label.config(text="抽签动画已取消")
+    
+    def stop_draw(self):
+        self.progress.stop()
+        self.progress.pack_forget()
         self.is_animating = False
         self.close_animation()
-        self.status_label.config(text="抽签动画已取消")
     
     def enhanced_update_animation(self, students):
         if self.animation_window and self.animation_window.winfo_exists():
@@ -1632,73 +1962,17 @@ Ctrl+Shift+U - 全选未抽中学生
             self.animation_window = None
     
     def weighted_lottery(self, num_to_select):
-        weights = []
-        for student in self.last_round_unselected:
-            weight = self.get_student_weight(student)
-            weights.append(weight)
-        
-        selected = []
-        available_students = self.last_round_unselected.copy()
-        available_weights = weights.copy()
-        
-        for _ in range(num_to_select):
-            if not available_students:
-                break
-            
-            chosen = random.choices(available_students, weights=available_weights, k=1)[0]
-            selected.append(chosen)
-            
-            index = available_students.index(chosen)
-            available_students.pop(index)
-            available_weights.pop(index)
-        
-        return selected
+        return self.engine.weighted_lottery(num_to_select)
     
     def fair_lottery(self, num_to_select):
-        selection_count = {}
-        for student in self.last_round_unselected:
-            selection_count[student] = 0
-        
-        for record in self.lottery_history:
-            for student in record["selected"]:
-                if student in selection_count:
-                    selection_count[student] += 1
-        
-        max_count = max(selection_count.values()) if selection_count else 1
-        weights = []
-        for student in self.last_round_unselected:
-            count = selection_count.get(student, 0)
-            weight = max_count - count + 1
-            weights.append(weight)
-        
-        selected = []
-        available_students = self.last_round_unselected.copy()
-        available_weights = weights.copy()
-        
-        for _ in range(num_to_select):
-            if not available_students:
-                break
-            
-            chosen = random.choices(available_students, weights=available_weights, k=1)[0]
-            selected.append(chosen)
-            
-            index = available_students.index(chosen)
-            available_students.pop(index)
-            available_weights.pop(index)
-        
-        return selected
+        return self.engine.fair_lottery(num_to_select)
     
     def finish_lottery(self, selected):
-        self.progress.stop()
-        self.progress.pack_forget()
-        self.is_animating = False
-        
-        self.close_animation()
+        self.stop_draw()
         
         self.update_selected_tree()
         self.update_unselected_tree()
         
-        self.current_round += 1
         self.round_label.config(text=str(self.current_round))
         
         self.update_statistics()
@@ -1758,10 +2032,7 @@ Ctrl+Shift+U - 全选未抽中学生
             if self.auto_backup:
                 self.auto_backup_data()
             
-            self.selected_students = []
-            self.current_round = 1
-            self.last_round_unselected = []
-            self.lottery_history = []
+            self.engine.reset()
             self.update_selected_tree()
             self.update_unselected_tree()
             self.update_statistics()
@@ -1781,28 +2052,8 @@ Ctrl+Shift+U - 全选未抽中学生
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write("抽签结果报告\n")
-                    file.write("=" * 40 + "\n")
-                    file.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    file.write(f"总抽签轮次: {self.current_round - 1}\n")
-                    file.write(f"已抽中总人数: {len(self.selected_students)}\n")
-                    file.write(f"剩余未抽中人数: {len(self.last_round_unselected)}\n\n")
-                    
-                    file.write("已抽中学生名单:\n")
-                    file.write("-" * 20 + "\n")
-                    for i, student in enumerate(self.selected_students, 1):
-                        file.write(f"{i}. {student}\n")
-                    
-                    file.write("\n抽签历史:\n")
-                    file.write("-" * 20 + "\n")
-                    for record in self.lottery_history:
-                        file.write(f"第{record['round']}轮 ({record['timestamp']}) [{record.get('mode', '常规')}]: {', '.join(record['selected'])}\n")
-                
-                messagebox.showinfo("成功", f"抽签结果已保存到: {file_path}")
-            except Exception as e:
-                messagebox.showerror("错误", f"保存文件时出错: {str(e)}")
+            self.run_export_job(export_results_job(ReportData(self.engine), file_path),
+                                f"抽签结果已保存到: {file_path}")
     
     def export_list(self):
         if not self.last_round_unselected:
@@ -1816,105 +2067,280 @@ Ctrl+Shift+U - 全选未抽中学生
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write("未抽中学生名单\n")
-                    file.write("=" * 20 + "\n")
-                    file.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    file.write(f"总人数: {len(self.last_round_unselected)}\n\n")
-                    for student in self.last_round_unselected:
-                        file.write(f"{student}\n")
-                
-                messagebox.showinfo("成功", f"未抽中名单已导出到: {file_path}")
-            except Exception as e:
-                messagebox.showerror("错误", f"导出文件时出错: {str(e)}")
+            self.run_export_job(export_unselected_job(ReportData(self.engine), file_path),
+                                f"未抽中名单已导出到: {file_path}")
     
     def show_history(self):
         if not self.lottery_history:
             messagebox.showinfo("抽签历史", "暂无抽签历史记录")
             return
         
-        history_text = "抽签历史记录:\n\n"
-        for record in self.lottery_history:
-            history_text += f"第{record['round']}轮 ({record['timestamp']}) [{record.get('mode', '常规')}]:\n"
-            history_text += f"  抽中: {', '.join(record['selected'])}\n\n"
-        
         history_window = tk.Toplevel(self.root)
         history_window.title("抽签历史记录")
-        history_window.geometry("500x400")
+        history_window.geometry("640x460")
         
-        text_area = scrolledtext.ScrolledText(history_window, wrap=tk.WORD, width=60, height=20)
-        text_area.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
-        text_area.insert(1.0, history_text)
-        text_area.config(state=tk.DISABLED)
+        pager = HistoryPager(self.engine)
+        pager.last_page()
+        
+        filter_frame = ttk.Frame(history_window)
+        filter_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        
+        ttk.Label(filter_frame, text="模式:").pack(side=tk.LEFT)
+        mode_var = tk.StringVar(value=MODE_ALL)
+        mode_combo = ttk.Combobox(filter_frame, textvariable=mode_var, state="readonly", width=10,
+                                  values=(MODE_ALL, MODE_NORMAL, MODE_WEIGHTED, MODE_FAIR, MODE_QUICK))
+        mode_combo.pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(filter_frame, text="跳转到第").pack(side=tk.LEFT)
+        round_entry = ttk.Entry(filter_frame, width=8)
+        round_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="轮").pack(side=tk.LEFT)
+        
+        tree_frame = ttk.Frame(history_window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        history_tree = ttk.Treeview(tree_frame, columns=("round", "timestamp", "mode", "selected"), show="headings")
+        history_tree.heading("round", text="轮次")
+        history_tree.heading("timestamp", text="时间")
+        history_tree.heading("mode", text="模式")
+        history_tree.heading("selected", text="抽中学生")
+        history_tree.column("round", width=60)
+        history_tree.column("timestamp", width=140)
+        history_tree.column("mode", width=80)
+        history_tree.column("selected", width=320)
+        
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=history_tree.yview)
+        history_tree.configure(yscrollcommand=scrollbar.set)
+        history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        detail_label = ttk.Label(history_window, text="", wraplength=600, justify=tk.LEFT)
+        detail_label.pack(fill=tk.X, padx=10)
+        
+        nav_frame = ttk.Frame(history_window)
+        nav_frame.pack(fill=tk.X, padx=10, pady=10)
+        page_label = ttk.Label(nav_frame, text="")
+        
+        page_rows = {}
+        
+        def render(highlight=None):
+            # 只格式化当前页的记录，历史再长打开和翻页的开销也只与页大小有关
+            history_tree.delete(*history_tree.get_children())
+            page_rows.clear()
+            
+            start = pager.page * pager.page_size
+            for offset, record in enumerate(pager.page_records()):
+                iid = history_tree.insert("", tk.END, values=(
+                    record['round'], record['timestamp'], record.get('mode', '常规'), ", ".join(record['selected'])))
+                page_rows[iid] = record
+                if start + offset == highlight:
+                    history_tree.selection_set(iid)
+                    history_tree.see(iid)
+            
+            if highlight is None:
+                children = history_tree.get_children()
+                if children:
+                    history_tree.see(children[-1])
+            
+            page_label.config(text=f"第 {pager.page + 1}/{pager.page_count} 页，共 {len(pager)} 条记录")
+            detail_label.config(text="")
+        
+        def go_to(page):
+            pager.go_to(page)
+            render()
+        
+        def on_mode_change(event=None):
+            pager.set_mode(mode_var.get())
+            pager.last_page()
+            render()
+        
+        def jump_to_round(event=None):
+            try:
+                round_num = int(round_entry.get())
+            except ValueError:
+                messagebox.showwarning("警告", "请输入有效的轮次", parent=history_window)
+                return
+            
+            position = pager.find_round(round_num)
+            if position is None:
+                messagebox.showinfo("提示", f"没有第{round_num}轮及之后的记录", parent=history_window)
+                return
+            render(highlight=position)
+        
+        def on_select(event=None):
+            selection = history_tree.selection()
+            if selection and selection[0] in page_rows:
+                record = page_rows[selection[0]]
+                detail_label.config(text=f"第{record['round']}轮 抽中: {', '.join(record['selected'])}")
+        
+        mode_combo.bind("<<ComboboxSelected>>", on_mode_change)
+        round_entry.bind("<Return>", jump_to_round)
+        history_tree.bind("<<TreeviewSelect>>", on_select)
+        ttk.Button(filter_frame, text="跳转", command=jump_to_round).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(nav_frame, text="首页", command=lambda: go_to(0)).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="上一页", command=lambda: go_to(pager.page - 1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text="下一页", command=lambda: go_to(pager.page + 1)).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="末页", command=lambda: go_to(pager.page_count - 1)).pack(side=tk.LEFT, padx=5)
+        page_label.pack(side=tk.LEFT, padx=10)
+        ttk.Button(nav_frame, text="关闭", command=history_window.destroy).pack(side=tk.RIGHT)
+        
+        render()
     
+    @timing_decorator("刷新已抽中列表")
     def update_selected_tree(self):
-        for item in self.selected_tree.get_children():
-            self.selected_tree.delete(item)
-        
-        for student in self.selected_students:
-            round_num = "未知"
-            timestamp = "未知"
-            for record in self.lottery_history:
-                if student in record["selected"]:
-                    round_num = str(record["round"])
-                    timestamp = record["timestamp"]
-                    break
-            
-            self.selected_tree.insert("", tk.END, text=student, values=(round_num, timestamp, self.get_student_weight(student)))
+        self.selected_tree.set_rows(self.selected_students, self.selected_row_values)
+    
+    def selected_row_values(self, student):
+        record = self.engine.first_selection_record(student)
+        if record:
+            return (str(record["round"]), record["timestamp"], self.get_student_weight(student))
+        return ("未知", "未知", self.get_student_weight(student))
     
+    @timing_decorator("刷新未抽中列表")
     def update_unselected_tree(self):
-        for item in self.unselected_tree.get_children():
-            self.unselected_tree.delete(item)
-        
-        for student in self.last_round_unselected:
-            self.unselected_tree.insert("", tk.END, text=student, values=("未抽中", self.get_student_weight(student)))
+        self.unselected_tree.set_rows(self.last_round_unselected, self.unselected_row_values)
+    
+    def unselected_row_values(self, student):
+        return ("未抽中", self.get_student_weight(student))
+    
+    @timing_decorator("生成快照")
+    def state_snapshot(self):
+        return {
+            **self.engine.to_dict(),
+            'settings': {
+                'auto_backup': self.auto_backup,
+                'auto_save': self.config.get('auto_save', True)
+            },
+            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
     
-    def save_unselected(self):
+    def save_unselected(self, force=False):
+        if not force and not self.storage.needs_compaction():
+            return
+        
         try:
-            with open("unselected_students.json", 'w', encoding='utf-8') as file:
-                json.dump({
-                    'unselected': self.last_round_unselected,
-                    'selected': self.selected_students,
-                    'round': self.current_round,
-                    'history': self.lottery_history,
-                    'weights': self.student_weights,
-                    'import_history': self.import_history,
-                    'settings': {
-                        'auto_backup': self.auto_backup,
-                        'auto_save': self.auto_save
-                    },
-                    'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }, file, ensure_ascii=False, indent=2)
+            self.storage.write_snapshot(self.state_snapshot())
         except Exception as e:
             print(f"保存未抽中名单时出错: {str(e)}")
     
+    def journal_operation(self, op):
+        try:
+            self.storage.append(op)
+        except Exception as e:
+            print(f"写入操作日志时出错: {str(e)}")
+    
     def load_unselected(self):
         try:
-            if os.path.exists("unselected_students.json"):
-                with open("unselected_students.json", 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    self.last_round_unselected = data.get('unselected', [])
-                    self.selected_students = data.get('selected', [])
-                    self.current_round = data.get('round', 1)
-                    self.lottery_history = data.get('history', [])
-                    self.student_weights = data.get('weights', {})
-                    self.import_history = data.get('import_history', [])
-                    
-                    settings = data.get('settings', {})
-                    self.auto_backup = settings.get('auto_backup', True)
-                    self.auto_save = settings.get('auto_save', True)
-                    
-                    self.update_students_text(self.last_round_unselected)
-                    self.update_selected_tree()
-                    self.update_unselected_tree()
-                    self.round_label.config(text=str(self.current_round))
-                    self.update_history_combo()
-                    
-                    last_updated = data.get('last_updated', '未知')
-                    self.status_label.config(text=f"已加载上次的抽签记录(最后更新: {last_updated})")
+            self.storage = self.create_storage()
+        except Exception as e:
+            print(f"打开存储时出错: {str(e)}")
+            self.storage = JournalStore(writer=self.writer, compression=self.compression, state_lock=StateLock())
+        
+        try:
+            data, ops = self.storage.load()
+            if data is not None or ops:
+                data = data or {}
+                self.engine.load_dict(data)
+                for op in ops:
+                    self.engine.apply(op)
+                
+                settings = data.get('settings', {})
+                self.auto_backup = settings.get('auto_backup', True)
+                self.auto_save = settings.get('auto_save', True)
+                
+                self.update_students_text(self.last_round_unselected)
+                self.update_selected_tree()
+                self.update_unselected_tree()
+                self.round_label.config(text=str(self.current_round))
+                self.update_history_combo()
+                
+                if ops or self.storage.needs_compaction():
+                    self.save_unselected(force=True)
+                
+                last_updated = data.get('last_updated', '未知')
+                status = f"已加载上次的抽签记录(最后更新: {last_updated})"
+                if ops:
+                    status += f"，已从操作日志恢复 {len(ops)} 条操作"
+                self.status_label.config(text=status)
         except Exception as e:
             print(f"加载未抽中名单时出错: {str(e)}")
+        
+        self.engine.add_observer(self.journal_operation)
+    
+    def reload_external_state(self):
+        discarded = self.storage.guard.conflict
+        try:
+            data, ops = self.storage.load()
+        except Exception as e:
+            print(f"重新加载存档时出错: {str(e)}")
+            return
+        
+        self.engine.load_dict(data or {})
+        for op in ops:
+            self.engine.apply(op)
+        if ops or self.storage.needs_compaction():
+            self.save_unselected(force=True)
+        
+        self.update_students_text(self.last_round_unselected)
+        self.update_selected_tree()
+        self.update_unselected_tree()
+        self.round_label.config(text=str(self.current_round))
+        self.update_history_combo()
+        self.update_statistics()
+        
+        status = "存档已被其他程序修改，已重新加载"
+        if discarded:
+            status += "，本窗口最近未保存的操作已放弃"
+        self.status_label.config(text=status)
+    
+    def on_undo_key(self, event=None):
+        if isinstance(self.root.focus_get(), (tk.Text, tk.Entry, ttk.Entry)):
+            return
+        self.undo_operation()
+    
+    def on_redo_key(self, event=None):
+        if isinstance(self.root.focus_get(), (tk.Text, tk.Entry, ttk.Entry)):
+            return
+        self.redo_operation()
+    
+    def undo_operation(self):
+        if self.is_animating:
+            return
+        
+        op = self.engine.undo()
+        if op is None:
+            self.status_label.config(text="没有可以撤销的操作")
+            return
+        
+        self.refresh_after_history_change()
+        self.status_label.config(text=f"已撤销: {OP_LABELS.get(op['op'], op['op'])}")
+    
+    def redo_operation(self):
+        if self.is_animating:
+            return
+        
+        op = self.engine.redo()
+        if op is None:
+            self.status_label.config(text="没有可以重做的操作")
+            return
+        
+        self.refresh_after_history_change()
+        self.status_label.config(text=f"已重做: {OP_LABELS.get(op['op'], op['op'])}")
+    
+    def refresh_after_history_change(self):
+        self.update_students_text(self.last_round_unselected)
+        self.update_selected_tree()
+        self.update_unselected_tree()
+        self.round_label.config(text=str(self.current_round))
+        self.update_history_combo()
+        self.update_statistics()
+    
+    def on_close(self):
+        if self.storage.needs_flush():
+            self.save_unselected(force=True)
+        self.writer.close(timeout=10)
+        self.root.destroy()
     
     def skip_round(self):
         if not self.last_round_unselected:
@@ -1922,7 +2348,7 @@ Ctrl+Shift+U - 全选未抽中学生
             return
             
         if messagebox.askyesno("确认", "确定要跳过本轮抽签吗？"):
-            self.current_round += 1
+            self.engine.skip_round()
             self.round_label.config(text=str(self.current_round))
             self.status_label.config(text=f"已跳过第 {self.current_round-1} 轮抽签")
 
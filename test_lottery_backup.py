@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from lottery_backup import BackupStore
+from lottery_engine import LotteryEngine
+
+
+def object_files(store):
+    found = set()
+    for prefix in os.listdir(store.objects_dir):
+        for name in os.listdir(os.path.join(store.objects_dir, prefix)):
+            found.add(prefix + name[:-len(".json")])
+    return found
+
+
+def make_state(students, drawn):
+    engine = LotteryEngine()
+    engine.add_students(students)
+    for selected in drawn:
+        engine.commit_draw(selected)
+    return engine.to_dict()
+
+
+class BackupChunkTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.store = BackupStore(os.path.join(self.workdir.name, "backups"), gc_interval=1000)
+
+    def test_same_payload_is_stored_once(self):
+        first = self.store.put_chunk(['a', 'b', 'c'])
+        second = self.store.put_chunk(['a', 'b', 'c'])
+
+        self.assertEqual(first, second)
+        self.assertEqual(object_files(self.store), {first})
+        self.assertEqual(self.store.get_chunk(first), ['a', 'b', 'c'])
+
+    def test_unchanged_roster_chunks_are_shared_between_backups(self):
+        students = [f"s{i}" for i in range(500)]
+        self.store.create_backup("backup_1", make_state(students, []), {}, 10)
+        before = object_files(self.store)
+        self.store.create_backup("backup_2", make_state(students + ["new"], []), {}, 10)
+        added = object_files(self.store) - before
+
+        # 只有末尾的名单块和清单中的其他小块是新写入的
+        self.assertLess(len(added), 5)
+
+    def test_garbage_collection_keeps_referenced_chunks(self):
+        self.store.create_backup("backup_1", make_state(list('abcdef'), [['a']]), {}, 1)
+        old_only = object_files(self.store)
+        state = make_state(list('uvwxyz'), [['u', 'v']])
+        self.store.create_backup("backup_2", state, {}, 1)
+        live = self.store.referenced_digests(os.path.join(self.store.root, "backup_2.json"))
+
+        removed = self.store.collect_garbage()
+
+        self.assertEqual(object_files(self.store), live)
+        self.assertEqual(removed, len(old_only - live))
+        data = self.store.read_backup(os.path.join(self.store.root, "backup_2.json"))
+        restored = LotteryEngine()
+        restored.load_dict(data)
+        self.assertEqual(restored.to_dict(), state)
+
+
+if __name__ == "__main__":
+    unittest.main()
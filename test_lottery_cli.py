@@ -0,0 +1,85 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import lottery_cli
+from lottery_engine import LotteryEngine
+from lottery_storage import JournalStore, StateLock, LOCK_FILE, STATE_FILE
+
+
+class CliDrawTest(unittest.TestCase):
+    def setUp(self):
+        # main 会切换到 --data-dir 指定的目录，测试结束后切回来
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.data_dir = self.workdir.name
+
+        roster = os.path.join(self.data_dir, "names.txt")
+        with open(roster, 'w', encoding='utf-8') as file:
+            file.write("张三\n李四\n王五\n赵六\n")
+        code, _, _ = self.cli("import", roster)
+        self.assertEqual(code, 0)
+
+    def cli(self, *argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = lottery_cli.main(["--data-dir", self.data_dir, *argv])
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def saved_engine(self):
+        data, ops = JournalStore(os.path.join(self.data_dir, STATE_FILE)).load()
+        engine = LotteryEngine()
+        engine.load_dict(data or {})
+        for op in ops:
+            engine.apply(op)
+        return engine
+
+    def test_draw_is_saved(self):
+        code, out, _ = self.cli("draw", "--count", "2", "--json")
+
+        self.assertEqual(code, 0)
+        result = json.loads(out)
+        self.assertEqual(result['round'], 1)
+        self.assertTrue(result['committed'])
+        self.assertEqual(len(result['selected']), 2)
+
+        engine = self.saved_engine()
+        self.assertEqual(engine.selected_students.as_list(), result['selected'])
+        self.assertEqual(len(engine.last_round_unselected), 2)
+        self.assertEqual(engine.current_round, 2)
+
+    def test_dry_run_leaves_state_unchanged(self):
+        code, out, _ = self.cli("draw", "--count", "3", "--dry-run", "--json")
+
+        self.assertEqual(code, 0)
+        self.assertFalse(json.loads(out)['committed'])
+        engine = self.saved_engine()
+        self.assertEqual(engine.selected_students.as_list(), [])
+        self.assertEqual(engine.current_round, 1)
+
+    def test_too_many_students_is_an_error(self):
+        code, _, err = self.cli("draw", "--count", "5")
+
+        self.assertEqual(code, 1)
+        self.assertIn("抽签时出错", err)
+        self.assertEqual(self.saved_engine().current_round, 1)
+
+    def test_locked_state_is_reported(self):
+        lock = StateLock(os.path.join(self.data_dir, LOCK_FILE))
+        self.assertTrue(lock.acquire())
+        self.addCleanup(lock.release)
+
+        code, _, err = self.cli("--wait", "0", "draw")
+
+        self.assertEqual(code, 1)
+        self.assertIn(lottery_cli.LOCK_MESSAGE, err)
+
+
+if __name__ == "__main__":
+    unittest.main()
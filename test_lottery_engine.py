@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from lottery_engine import LotteryEngine
+from lottery_importer import RosterImporter
+
+
+class UndoOrderTest(unittest.TestCase):
+    def test_undo_restores_roster_order_after_renumbering(self):
+        engine = LotteryEngine()
+        engine.add_students(list('hgfedcba'))
+        engine.commit_draw(['f'])
+        engine.move_to_selected(['h'])
+
+        engine.undo()
+        engine.undo()
+
+        self.assertEqual(engine.last_round_unselected.as_list(), list('hgfedcba'))
+        self.assertEqual(engine.selected_students.as_list(), [])
+
+    def test_undo_two_draws_in_a_row(self):
+        engine = LotteryEngine()
+        engine.add_students(list('abcdefgh'))
+        engine.commit_draw(['c', 'f'])
+        engine.commit_draw(['b', 'g'])
+
+        engine.undo()
+        self.assertEqual(engine.last_round_unselected.as_list(), list('abdegh'))
+        engine.undo()
+        self.assertEqual(engine.last_round_unselected.as_list(), list('abcdefgh'))
+
+    def test_undo_reset_restores_weights_before_later_edits(self):
+        engine = LotteryEngine()
+        engine.add_students(list('abc'))
+        engine.reset()
+        engine.set_weight('a', 9)
+        engine.reset_weights()
+
+        engine.undo()
+        engine.undo()
+        engine.undo()
+
+        self.assertEqual(engine.student_weights, {})
+        self.assertEqual(engine.last_round_unselected.as_list(), list('abc'))
+
+    def test_import_is_undone_as_a_single_operation(self):
+        engine = LotteryEngine()
+        engine.add_students(['x'])
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "names.txt")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write("\n".join(f"s{i}" for i in range(25)) + "\nx\n")
+            added, duplicates = RosterImporter(engine, path, chunk_size=10).run()
+        engine.record_import("names.txt", path, added)
+
+        self.assertEqual((len(added), duplicates), (25, 1))
+        self.assertEqual(len(engine.undo_stack), 2)
+        engine.undo()
+        self.assertEqual(engine.last_round_unselected.as_list(), ['x'])
+        self.assertEqual(engine.import_history, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from lottery_engine import LotteryEngine
+from lottery_history import HistoryPager
+
+
+class HistoryPagerTest(unittest.TestCase):
+    def test_mode_filter_follows_undo_and_new_draw(self):
+        engine = LotteryEngine()
+        engine.add_students(list('abcdef'))
+        engine.commit_draw(['a'], mode="常规")
+        engine.commit_draw(['b'], mode="权重模式")
+
+        pager = HistoryPager(engine)
+        pager.set_mode("权重模式")
+        self.assertEqual([record['selected'] for record in pager.page_records()], [['b']])
+
+        # 撤销后换一种模式再抽，历史条数与之前相同
+        engine.undo()
+        engine.commit_draw(['c'], mode="常规")
+
+        self.assertEqual(len(pager), 0)
+        self.assertEqual(pager.page_records(), [])
+        pager.set_mode("常规")
+        self.assertEqual([record['selected'] for record in pager.page_records()], [['a'], ['c']])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+
+from lottery_engine import LotteryEngine
+from lottery_importer import RosterImporter, detect_encoding, read_header
+from lottery_storage import JournalStore
+
+
+class ImporterErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.workdir.name, name)
+
+    def test_decode_error_leaves_roster_and_journal_unchanged(self):
+        store = JournalStore(self.path("state.json"))
+        store.load()
+        engine = LotteryEngine()
+        engine.add_observer(store.append)
+        engine.add_students(['x'])
+        with open(store.journal_file, 'rb') as file:
+            journal_before = file.read()
+
+        # 前面的内容足够多，出错前已经读完若干块
+        with open(self.path("names.txt"), 'wb') as file:
+            file.write("\n".join(f"s{i}" for i in range(3000)).encode('utf-8'))
+            file.write("\n张三\n李四\n".encode('gbk'))
+
+        importer = RosterImporter(engine, self.path("names.txt"), "utf-8", chunk_size=500)
+        with self.assertRaises(UnicodeDecodeError):
+            importer.run()
+
+        self.assertTrue(importer.added)
+        self.assertEqual(engine.last_round_unselected.as_list(), ['x'])
+        self.assertEqual(engine.import_history, [])
+        with open(store.journal_file, 'rb') as file:
+            self.assertEqual(file.read(), journal_before)
+
+
+class EncodingDetectionTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.workdir.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_utf8_bom(self):
+        path = self.write("bom.txt", "\ufeff张三\n李四\n".encode('utf-8'))
+        self.assertEqual(detect_encoding(path), "utf-8-sig")
+        added, _ = RosterImporter(LotteryEngine(), path).run()
+        # BOM 不能混进第一个名字
+        self.assertEqual(added, ['张三', '李四'])
+
+    def test_utf16_bom(self):
+        path = self.write("utf16.txt", "张三\n李四\n".encode('utf-16'))
+        self.assertEqual(detect_encoding(path), "utf-16")
+        self.assertEqual(RosterImporter(LotteryEngine(), path).run()[0], ['张三', '李四'])
+
+    def test_gbk_without_bom(self):
+        path = self.write("gbk.txt", "张三\n李四\n王五\n".encode('gbk'))
+        self.assertEqual(detect_encoding(path), "gbk")
+        self.assertEqual(RosterImporter(LotteryEngine(), path).run()[0], ['张三', '李四', '王五'])
+
+    def test_plain_utf8(self):
+        path = self.write("utf8.txt", "张三\n李四\n".encode('utf-8'))
+        self.assertEqual(detect_encoding(path), "utf-8")
+
+
+class CsvImportTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.path = os.path.join(self.workdir.name, "class.csv")
+        with open(self.path, 'w', encoding='gbk', newline='') as file:
+            file.write("学号,姓名,班级\r\n1,张三,一班\r\n2,\"李,四\",一班\r\n3,,二班\r\n4,张三,二班\r\n")
+
+    def test_header_is_read_with_detected_encoding(self):
+        self.assertEqual(read_header(self.path, detect_encoding(self.path)), ['学号', '姓名', '班级'])
+
+    def test_selected_column_is_imported(self):
+        engine = LotteryEngine()
+        importer = RosterImporter(engine, self.path, column=1, has_header=True)
+        added, duplicates = importer.run()
+
+        # 空单元格跳过，重复的名字只计数
+        self.assertEqual(added, ['张三', '李,四'])
+        self.assertEqual(duplicates, 1)
+
+    def test_missing_column_yields_nothing(self):
+        importer = RosterImporter(LotteryEngine(), self.path, column=5, has_header=True)
+        self.assertEqual(importer.run(), ([], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import random
+import unittest
+
+from lottery_sampling import FenwickSampler, weighted_sample
+
+
+def sequential_sample(items, weights, num_to_select, rng):
+    # 逐个累加权重查找，抽中后从候选中删除，作为对照
+    items = list(items)
+    weights = [w if w > 0 else 0 for w in weights]
+    result = []
+    for _ in range(num_to_select):
+        total = sum(weights)
+        if total <= 0:
+            break
+        target = rng.random() * total
+        acc = 0
+        for index, weight in enumerate(weights):
+            acc += weight
+            if target < acc:
+                break
+        result.append(items.pop(index))
+        weights.pop(index)
+    return result
+
+
+class FenwickSamplerTest(unittest.TestCase):
+    def test_matches_sequential_sampling_without_replacement(self):
+        # 整数权重的累加没有浮点误差，两种做法在同一随机序列下结果应完全一致
+        items = [f"s{i}" for i in range(37)]
+        for seed in range(200):
+            weights = [random.Random(seed * 100 + i).randint(0, 5) for i in range(len(items))]
+            count = seed % 12 + 1
+            expected = sequential_sample(items, weights, count, random.Random(seed))
+            actual = weighted_sample(items, weights, count, random.Random(seed))
+            self.assertEqual(actual, expected, f"seed={seed}")
+
+    def test_zero_weights_are_never_picked(self):
+        weights = [0, 3, 0, 1, 0, 2]
+        sampler = FenwickSampler(weights)
+        indices = sampler.sample(10, random.Random(1))
+        self.assertEqual(sorted(indices), [1, 3, 5])
+
+    def test_restore_keeps_tree_for_next_sample(self):
+        weights = [1, 2, 3, 4, 5]
+        sampler = FenwickSampler(weights)
+        sampler.sample(3, random.Random(2), restore=True)
+        self.assertEqual(sampler.weights, weights)
+        self.assertEqual(sampler.total, sum(weights))
+        self.assertEqual([sampler.prefix_sum(i) for i in range(6)], [0, 1, 3, 6, 10, 15])
+
+
+if __name__ == "__main__":
+    unittest.main()
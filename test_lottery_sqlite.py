@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from lottery_engine import LotteryEngine
+from lottery_sqlite import SqliteStore
+from lottery_storage import JournalStore
+
+
+def restore(store):
+    data, ops = store.load()
+    engine = LotteryEngine()
+    engine.load_dict(data or {})
+    for op in ops:
+        engine.apply(op)
+    return engine
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.state_file = os.path.join(self.workdir.name, "state.json")
+        self.db_file = os.path.join(self.workdir.name, "lottery.db")
+
+    def open_db(self):
+        store = SqliteStore(self.db_file, legacy_file=self.state_file)
+        self.addCleanup(store.conn.close)
+        return store
+
+    def test_json_state_round_trips_through_sqlite(self):
+        journal = JournalStore(self.state_file)
+        journal.load()
+        engine = LotteryEngine()
+        engine.add_observer(journal.append)
+        engine.add_students(list('abcdefg'))
+        engine.commit_draw(['c', 'a'], timestamp="2024-03-01 08:00:00")
+        journal.write_snapshot(engine.to_dict())
+        engine.set_weight('b', 2.5)
+        engine.record_import("班级", "class.txt", ['x', 'y'])
+        engine.commit_draw(['x'], timestamp="2024-03-01 08:05:00")
+        expected = engine.to_dict()
+
+        # 第一次打开数据库时读入 JSON 存档和日志，写完快照后迁移结束
+        store = self.open_db()
+        migrated = restore(store)
+        self.assertTrue(store.needs_flush())
+        self.assertEqual(migrated.to_dict(), expected)
+        store.write_snapshot(migrated.to_dict())
+        self.assertFalse(store.needs_flush())
+
+        store = self.open_db()
+        reloaded = restore(store)
+        self.assertFalse(store.needs_flush())
+        self.assertEqual(reloaded.last_round_unselected.as_list(), engine.last_round_unselected.as_list())
+        self.assertEqual(reloaded.selected_students.as_list(), ['c', 'a', 'x'])
+        self.assertEqual(list(reloaded.lottery_history), list(engine.lottery_history))
+        self.assertEqual(reloaded.student_weights, engine.student_weights)
+        self.assertEqual(reloaded.current_round, engine.current_round)
+        self.assertEqual([record['name'] for record in reloaded.import_history], ["班级"])
+
+    def test_ops_after_migration_are_written_to_sqlite(self):
+        store = self.open_db()
+        engine = restore(store)
+        engine.add_observer(store.append)
+        engine.add_students(list('abc'))
+        engine.commit_draw(['b'])
+
+        reloaded = restore(self.open_db())
+        self.assertEqual(reloaded.last_round_unselected.as_list(), ['a', 'c'])
+        self.assertEqual(reloaded.selected_students.as_list(), ['b'])
+        self.assertEqual(len(reloaded.lottery_history), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
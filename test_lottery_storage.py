@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from lottery_engine import LotteryEngine
+from lottery_storage import JournalStore
+
+
+def restore(store):
+    data, ops = store.load()
+    engine = LotteryEngine()
+    engine.load_dict(data or {})
+    for op in ops:
+        engine.apply(op)
+    return engine, ops
+
+
+class JournalRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.state_file = os.path.join(self.workdir.name, "state.json")
+
+    def record(self):
+        store = JournalStore(self.state_file)
+        store.load()
+        engine = LotteryEngine()
+        engine.add_observer(store.append)
+        return engine, store
+
+    def test_replay_after_snapshot(self):
+        engine, store = self.record()
+        engine.add_students(list('abcdef'))
+        engine.commit_draw(['b'])
+        store.write_snapshot(engine.to_dict())
+        engine.commit_draw(['d', 'e'])
+        engine.set_weight('a', 3)
+
+        restored, ops = restore(JournalStore(self.state_file))
+
+        # 快照之前的操作不再重放
+        self.assertEqual([op['op'] for op in ops], ['draw', 'weights'])
+        self.assertEqual(restored.to_dict(), engine.to_dict())
+
+    def test_torn_last_line_is_dropped(self):
+        engine, store = self.record()
+        engine.add_students(list('abcdef'))
+        engine.commit_draw(['b'])
+        expected = engine.to_dict()
+        with open(store.journal_file, 'a', encoding='utf-8') as file:
+            file.write('{"op":"draw","selected":["c"')
+
+        restored, ops = restore(JournalStore(self.state_file))
+
+        self.assertEqual(len(ops), 2)
+        self.assertEqual(restored.to_dict(), expected)
+        # 半行记录被截掉后，后续追加的记录可以正常读回
+        with open(store.journal_file, 'r', encoding='utf-8') as file:
+            self.assertTrue(file.read().endswith("}\n"))
+
+        store = JournalStore(self.state_file)
+        restored, _ = restore(store)
+        restored.add_observer(store.append)
+        restored.commit_draw(['c'])
+        again, ops = restore(JournalStore(self.state_file))
+        self.assertEqual(len(ops), 3)
+        self.assertEqual(again.selected_students.as_list(), ['b', 'c'])
+
+
+if __name__ == "__main__":
+    unittest.main()